@@ -1,21 +1,53 @@
 # app.py
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, flash, session, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
-from models import db, User, Shoutbox, Announcement, Marketplace, Service, Comment
-import string, random, os 
-from captcha.image import ImageCaptcha
-from datetime import datetime
+from password_service import PasswordService, PasswordServiceBusy
+import database
+from models import db, User, Shoutbox, Post, Announcement, Marketplace, Service, Comment
+import search_index
+import migrations
+import counters
+import user_summary
+from shoutbox_hub import ShoutboxHub, serialize_shout
+from user_cache import UserCache
+from response_cache import ResponseCache, backend_from_url
+from instrumentation import Instrumentation
+import queue
+import string, os, secrets, time
+from captcha_pool import CaptchaPool
+from datetime import datetime, timezone
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from sqlalchemy import func, select, tuple_
+
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ForumJSONProvider(DefaultJSONProvider):
+    """Serialize DateTime columns in the forum's display format instead of HTTP date format."""
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime):
+            return o.strftime(DATE_FORMAT)
+        return DefaultJSONProvider.default(o)
 
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.json = ForumJSONProvider(app)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-db.init_app(app)
+# bcrypt cost factor; lower it (minimum 4) in test environments to make logins cheap
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_WORKERS'] = int(os.environ.get('PASSWORD_WORKERS', 4))
+app.config['PASSWORD_QUEUE_SIZE'] = int(os.environ.get('PASSWORD_QUEUE_SIZE', 16))
+database.init_app(app, db)
 bcrypt = Bcrypt(app)
+# Hashing runs on its own bounded pool so login bursts cannot starve the read endpoints
+passwords = PasswordService(bcrypt, workers=app.config['PASSWORD_WORKERS'],
+                            queue_size=app.config['PASSWORD_QUEUE_SIZE'])
+PASSWORD_RETRY_AFTER = 5  # seconds clients are asked to wait when the password pool is full
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
@@ -26,6 +58,36 @@ limiter = Limiter(
     storage_uri="memory://"
 )
 
+# Author names and the logged-in user come from here instead of the user table
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 300))  # seconds before another process's user edits show up
+user_cache = UserCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+# Caches the public list endpoints until a write bumps the generation of a table they read
+app.config['RESPONSE_CACHE_URL'] = os.environ.get('RESPONSE_CACHE_URL', 'memory://')
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+response_cache = ResponseCache(backend_from_url(app.config['RESPONSE_CACHE_URL'], app.config['RESPONSE_CACHE_SIZE']))
+
+# Fans new shoutbox rows out to /api/shoutbox/stream clients. Each open stream holds a gthread
+# thread for its lifetime, so a worker only takes this many; the rest get a 503 and main.js
+# falls back to polling
+app.config['SHOUTBOX_STREAMS_PER_WORKER'] = int(os.environ.get('SHOUTBOX_STREAMS_PER_WORKER', 16))
+shoutbox_hub = ShoutboxHub(app, user_cache, max_subscribers=app.config['SHOUTBOX_STREAMS_PER_WORKER'])
+SHOUTBOX_STREAM_KEEPALIVE = 15  # seconds between comment lines on an idle stream
+SHOUTBOX_STREAM_LIFETIME = 300  # seconds before a stream is closed so the client reconnects
+SHOUTBOX_MESSAGE_LENGTH = 50
+
+# Opt-in: count SQL statements and time each request, report them in a Server-Timing header
+# and serve per-endpoint totals at /metrics
+app.config['INSTRUMENTATION'] = os.environ.get('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+instrumentation = Instrumentation()
+if app.config['INSTRUMENTATION']:
+    with app.app_context():
+        instrumentation.init_app(app, db.engine)
+    instrumentation.add_stats('user_cache', user_cache.stats)
+    instrumentation.add_stats('response_cache', response_cache.stats)
+    instrumentation.add_stats('shoutbox_streams', shoutbox_hub.stats)
+
 @app.errorhandler(429)
 def ratelimit_handler(e):
     if request.path.startswith('/api/'):
@@ -37,7 +99,76 @@ def ratelimit_handler(e):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id))
+
+def comment_counts(post_ids):
+    """Return {post_id: comment count} for a page of posts with a single grouped query."""
+    if not post_ids:
+        return {}
+    rows = db.session.query(Comment.post_id, func.count(Comment.id)).filter(
+        Comment.post_id.in_(post_ids)
+    ).group_by(Comment.post_id).all()
+    return dict(rows)
+
+def table_version(model, date_column):
+    """Return (tag, last_modified) for a table from its max id and max date, both read off an index."""
+    # Two scalar subqueries rather than one SELECT max(), max(): SQLite only answers a lone
+    # min/max aggregate from the index and would scan the table otherwise
+    max_id, last_modified = db.session.execute(select(
+        select(func.max(model.id)).scalar_subquery(),
+        select(func.max(date_column)).scalar_subquery()
+    )).one()
+    stamp = int(last_modified.replace(tzinfo=timezone.utc).timestamp()) if last_modified else 0
+    return f'{max_id or 0}-{stamp}', last_modified
+
+def conditional_response(tag, last_modified, build):
+    """Answer 304 Not Modified when the client already has this version, else call build().
+
+    The body is only built when it is actually sent, so a poll that finds nothing new costs
+    the version lookup alone.
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(tag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    response = Response(status=304) if fresh else build()
+    response.set_etag(tag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.cache_control.no_cache = True
+    return response
+
+# post_type used in URLs -> Post subclass
+POST_TYPES = {model.__mapper__.polymorphic_identity: model for model in (Announcement, Marketplace, Service)}
+
+def serialize_post(post, html=False):
+    """Return the fields every post type shares plus its body: content for announcements,
+    description and price for marketplace posts and services.
+
+    With html, newlines in marketplace descriptions become <br> for the pages that insert
+    them as HTML.
+    """
+    data = {
+        'id': post.id,
+        'category': post.category,
+        'title': post.title,
+        'date': post.date
+    }
+    if post.post_type == 'announcements':
+        data['content'] = post.body
+    else:
+        data['description'] = post.body.replace('\n', '<br>') if html and post.post_type == 'marketplace' else post.body
+        data['price'] = post.price
+    return data
+
+# Categories shown on the home, marketplace and services pages
+CATEGORIES = {
+    'announcements': ['Announcements', 'General', 'MM Service'],
+    'marketplace': ['Buyers', 'Sellers'],
+    'services': ['Buy', 'Sell']
+}
 
 # Routes for pages
 @app.route('/')
@@ -58,30 +189,95 @@ def search():
     return render_template('search.html')
 
 # CAPTCHA configuration
-CAPTCHA_LENGTH = 6
-CAPTCHA_CHARS = string.ascii_uppercase + string.digits
-image_captcha = ImageCaptcha(fonts=['fonts/DejaVuSans.ttf'], width=200, height=60)
-
-
-def generate_captcha():
-    """Generate an 6-character CAPTCHA and image."""
-    code = ''.join(random.choice(CAPTCHA_CHARS) for _ in range(CAPTCHA_LENGTH))
-    random_name = ''.join(random.choice(string.ascii_lowercase) for _ in range(10))
-    image_path = os.path.join('static', 'captchas', f'captcha_{random_name}.png')
-    image_captcha.write(code, image_path)
-    return code, image_path
+app.config['CAPTCHA_POOL_SIZE'] = int(os.environ.get('CAPTCHA_POOL_SIZE', 50))        # pre-rendered images kept ready per worker
+app.config['CAPTCHA_POOL_MAX_AGE'] = int(os.environ.get('CAPTCHA_POOL_MAX_AGE', 600))  # seconds before an unused pooled image is replaced
+app.config['CAPTCHA_EXPIRY'] = int(os.environ.get('CAPTCHA_EXPIRY', 300))              # seconds a user has to solve an issued CAPTCHA
+# Load tests only: when set, /api/test/captcha reveals the session's CAPTCHA to clients that send
+# this value in the X-Loadtest-Secret header. Leave unset anywhere real users or scrapers connect.
+app.config['LOADTEST_SECRET'] = os.environ.get('LOADTEST_SECRET')
+captcha_pool = CaptchaPool(
+    fonts=['fonts/DejaVuSans.ttf'],
+    length=6,
+    chars=string.ascii_uppercase + string.digits,
+    size=app.config['CAPTCHA_POOL_SIZE'],
+    max_age=app.config['CAPTCHA_POOL_MAX_AGE'],
+    expiry=app.config['CAPTCHA_EXPIRY']
+)
+instrumentation.add_stats('captcha', captcha_pool.stats)
+
+
+def new_captcha():
+    """Take a CAPTCHA from the pool, remember it in the session and return its image token."""
+    captcha_pool.discard(session.pop('captcha_token', None))
+    token, code = captcha_pool.issue()
+    session['captcha'] = code
+    session['captcha_token'] = token
+    session['captcha_issued'] = time.time()
+    return token
+
+def captcha_valid(captcha_input):
+    """Check the submitted code against the session's CAPTCHA, which is single use and expires."""
+    expected = session.pop('captcha', None)
+    issued = session.pop('captcha_issued', 0)
+    return expected is not None and captcha_input == expected and \
+        time.time() - issued < app.config['CAPTCHA_EXPIRY']
+
+@app.route('/captcha/<token>.png')
+@limiter.exempt
+def captcha_image(token):
+    png = captcha_pool.image(token)
+    if png is None:
+        # Issued by another worker process: draw the same code again from the session
+        if token != session.get('captcha_token') or not session.get('captcha'):
+            return Response(status=404)
+        png = captcha_pool.render(session['captcha'])
+    response = Response(png, mimetype='image/png')
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/api/captcha/stats')
+def captcha_stats():
+    return jsonify(captcha_pool.stats())
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    if not instrumentation.enabled:
+        return Response(status=404)
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+def is_loadtest_request():
+    secret = app.config['LOADTEST_SECRET']
+    return bool(secret) and secrets.compare_digest(request.headers.get('X-Loadtest-Secret', ''), secret)
+
+@limiter.request_filter
+def loadtest_exempt():
+    # A load test drives one address far past the per-IP limits it is meant to measure around
+    return is_loadtest_request()
+
+@app.route('/api/test/captcha')
+@limiter.exempt
+def captcha_test_hook():
+    """Return the current session's CAPTCHA code so loadtest.py can log in."""
+    if not is_loadtest_request():
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'captcha': session.get('captcha')})
+
+def password_service_busy(template, **context):
+    """Re-render a form with 503 and Retry-After when the password pool is saturated."""
+    flash('Too many login attempts right now, please try again in a few seconds', 'danger')
+    response = app.make_response((render_template(template, **context), 503))
+    response.retry_after = PASSWORD_RETRY_AFTER
+    return response
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('home'))
     
-    # Generate CAPTCHA for GET request
+    # Issue a CAPTCHA for GET request
     if request.method == 'GET':
-        captcha_code, captcha_image = generate_captcha()
-        session['captcha'] = captcha_code
-        session['captcha_image'] = captcha_image
-        return render_template('login.html', captcha_image=captcha_image)
+        return render_template('login.html', captcha_token=new_captcha())
     
     # Handle POST request
     username = request.form['username']
@@ -89,34 +285,25 @@ def login():
     captcha_input = request.form['captcha'].strip().upper()
     
     # Validate CAPTCHA first
-    if captcha_input != session.get('captcha'):
+    if not captcha_valid(captcha_input):
         flash('Invalid CAPTCHA', 'danger')
-        # Generate new CAPTCHA for next attempt
-        captcha_code, captcha_image = generate_captcha()
-        session['captcha'] = captcha_code
-        session['captcha_image'] = captcha_image
-        return render_template('login.html', captcha_image=captcha_image)
+        # Issue a new CAPTCHA for next attempt
+        return render_template('login.html', captcha_token=new_captcha())
     
     # Validate credentials
     user = User.query.filter_by(username=username).first()
-    if user and bcrypt.check_password_hash(user.password, password):
+    try:
+        authenticated = user is not None and passwords.verify(user.password, password)
+    except PasswordServiceBusy:
+        return password_service_busy('login.html', captcha_token=new_captcha())
+    if authenticated:
         login_user(user)
-        captcha_image = session.get('captcha_image')
-        session.pop('captcha', None)
-        session.pop('captcha_image', None)
-        if captcha_image:  # Ensure path exists before removing
-            try:
-                os.remove(captcha_image)
-            except OSError as e:
-                print(f"Error deleting CAPTCHA image: {e}")
+        captcha_pool.discard(session.pop('captcha_token', None))
         return redirect(url_for('home'))
     
     flash('Invalid username or password', 'danger')
-    # Generate new CAPTCHA for next attempt
-    captcha_code, captcha_image = generate_captcha()
-    session['captcha'] = captcha_code
-    session['captcha_image'] = captcha_image  # Store new image path
-    return render_template('login.html', captcha_image=captcha_image)
+    # Issue a new CAPTCHA for next attempt
+    return render_template('login.html', captcha_token=new_captcha())
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -133,7 +320,10 @@ def register():
         if User.query.filter_by(username=username).first():
             flash('Username already taken', 'danger')
             return render_template('register.html')
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = passwords.hash(password)
+        except PasswordServiceBusy:
+            return password_service_busy('register.html')
         user = User(username=username, password=hashed_password, avatar='default.jpg')
         db.session.add(user)
         db.session.commit()
@@ -165,293 +355,429 @@ def post_detail(post_type, post_id):
 @limiter.limit("30 per minute")
 @login_required
 def api_post_detail(post_type, post_id):
-    def format_date(date_obj):
-        """Helper function to format date as string, handling both datetime and string inputs."""
-        if isinstance(date_obj, datetime):
-            return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-        elif isinstance(date_obj, str):
-            try:
-                parsed_date = datetime.strptime(date_obj, '%Y-%m-%d %H:%M:%S')
-                return parsed_date.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                return date_obj
-        return 'N/A'
-
-    if post_type == 'announcements':
-        post = Announcement.query.get_or_404(post_id)
-        post_data = {
-            'id': post.id,
-            'title': post.title,
-            'category': post.category,
-            'content': post.content,
-            'user_id': post.user_id,
-            'username': post.author.username,
-            'date': format_date(post.date)
-        }
-        comments = Comment.query.filter_by(post_type='announcement', post_id=post_id).order_by(Comment.date.desc()).all()
-    elif post_type == 'marketplace':
-        post = Marketplace.query.get_or_404(post_id)
-        post_data = {
-            'id': post.id,
-            'title': post.title,
-            'category': post.category,
-            'description': post.description,
-            'price': post.price,
-            'user_id': post.user_id,
-            'username': post.author.username,
-            'date': format_date(post.date)
-        }
-        comments = Comment.query.filter_by(post_type='marketplace', post_id=post_id).order_by(Comment.date.desc()).all()
-    elif post_type == 'services':
-        post = Service.query.get_or_404(post_id)
-        post_data = {
-            'id': post.id,
-            'title': post.title,
-            'category': post.category,
-            'description': post.description,
-            'price': post.price,
-            'user_id': post.user_id,
-            'username': post.author.username,
-            'date': format_date(post.date)
-        }
-        comments = Comment.query.filter_by(post_type='service', post_id=post_id).order_by(Comment.date.desc()).all()
-    else:
+    if post_type not in POST_TYPES:
         return jsonify({'error': 'Invalid post type'}), 404
-
-    user = User.query.get_or_404(post_data['user_id'])
-    post_count = len(user.announcements) + len(user.marketplace_posts) + len(user.services)
+    post = POST_TYPES[post_type].query.filter_by(id=post_id).first_or_404()
+    post_data = serialize_post(post)
+    post_data['user_id'] = post.user_id
+    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.date.desc()).all()
+
+    names = user_cache.usernames([post.user_id] + [comment.user_id for comment in comments])
+    post_data['username'] = names.get(post.user_id)
+    post_count = user_summary.summary(post.user_id)['post_count']
     comments_data = [{
         'id': comment.id,
         'content': comment.content,
-        'username': comment.author.username,
-        'date': format_date(comment.date)
+        'username': names.get(comment.user_id),
+        'date': comment.date
     } for comment in comments]
 
     return jsonify({
         'post': post_data,
         'comments': comments_data,
         'user': {
-            'username': user.username,
+            'username': post_data['username'],
             'post_count': post_count
         }
     })
 
 
 
+PROFILE_PAGE_SIZE = 20
+
+def user_posts_page(user_id, page):
+    """Return one page of a user's posts of every type, newest first.
+
+    One query on the post table's (user_id, date) index cuts the page in the database;
+    comment counts for the page come from one grouped query.
+    """
+    posts = Post.query.filter_by(user_id=user_id).order_by(Post.date.desc(), Post.id.desc()) \
+        .limit(PROFILE_PAGE_SIZE).offset((page - 1) * PROFILE_PAGE_SIZE).all()
+    comments = comment_counts([post.id for post in posts])
+    return [{
+        'post_type': post.post_type,
+        'id': post.id,
+        'category': post.category,
+        'title': post.title,
+        'price': post.price,
+        'date': post.date,
+        'comments': comments.get(post.id, 0)
+    } for post in posts]
+
+def user_comments_page(user_id, page):
+    """Return one page of a user's comments, newest first, with the type of the post they are on."""
+    rows = db.session.query(Comment, Post.post_type).join(Post, Comment.post_id == Post.id) \
+        .filter(Comment.user_id == user_id).order_by(Comment.date.desc(), Comment.id.desc()) \
+        .limit(PROFILE_PAGE_SIZE).offset((page - 1) * PROFILE_PAGE_SIZE).all()
+    return [{
+        'post_type': post_type,
+        'post_id': comment.post_id,
+        'content': comment.content,
+        'date': comment.date
+    } for comment, post_type in rows]
+
 @app.route('/profile/<username>')
 @login_required
 def profile_detail(username):
     user = User.query.filter_by(username=username).first_or_404()
-    post_count = len(user.announcements) + len(user.marketplace_posts) + len(user.services)
-    posts = []
-    for post in user.announcements:
-        posts.append({
-            'post_type': 'announcements',
-            'id': post.id,
-            'category': post.category,
-            'title': post.title,
-            'content': post.content,
-            'date': post.date,
-            'comments': Comment.query.filter_by(post_type='announcement', post_id=post.id).count()
-        })
-    for post in user.marketplace_posts:
-        posts.append({
-            'post_type': 'marketplace',
-            'id': post.id,
-            'category': post.category,
-            'title': post.title,
-            'description': post.description,
-            'price': post.price,
-            'date': post.date,
-            'comments': Comment.query.filter_by(post_type='marketplace', post_id=post.id).count()
-        })
-    for post in user.services:
-        posts.append({
-            'post_type': 'services',
-            'id': post.id,
-            'category': post.category,
-            'title': post.title,
-            'description': post.description,
-            'price': post.price,
-            'date': post.date,
-            'comments': Comment.query.filter_by(post_type='service', post_id=post.id).count()
-        })
-    return render_template('profile_detail.html', user=user, post_count=post_count, posts=posts)
+    page = max(request.args.get('page', 1, type=int), 1)
+    comments_page = max(request.args.get('comments_page', 1, type=int), 1)
+    # Totals come from the per-user summary rather than counting the user's rows per request
+    stats = user_summary.summary(user.id)
+    return render_template(
+        'profile_detail.html', user=user, post_count=stats['post_count'],
+        comment_count=stats['comment_count'], last_active=stats['last_active'],
+        posts=user_posts_page(user.id, page), page=page,
+        total_pages=-(-stats['post_count'] // PROFILE_PAGE_SIZE),
+        comments=user_comments_page(user.id, comments_page), comments_page=comments_page,
+        comments_total_pages=-(-stats['comment_count'] // PROFILE_PAGE_SIZE)
+    )
 
 # API endpoints for dynamic data
 @app.route('/api/shoutbox')
 def get_shoutbox():
-    shoutbox = Shoutbox.query.order_by(Shoutbox.timestamp.desc()).limit(10).all()
-    return jsonify([{
-        'id': item.id,
-        'username': item.author.username,
-        'message': item.message,
-        'timestamp': item.timestamp
-    } for item in shoutbox])
+    tag, last_modified = table_version(Shoutbox, Shoutbox.timestamp)
+
+    def build():
+        shoutbox = Shoutbox.query.order_by(Shoutbox.timestamp.desc()).limit(10).all()
+        names = user_cache.usernames(item.user_id for item in shoutbox)
+        return jsonify([{
+            'id': item.id,
+            'username': names.get(item.user_id),
+            'message': item.message,
+            'timestamp': item.timestamp
+        } for item in shoutbox])
+    return conditional_response(f'shoutbox-{tag}', last_modified, build)
+
+@app.route('/api/shoutbox', methods=['POST'])
+@limiter.limit("10 per minute")
+@login_required
+def post_shoutbox():
+    # Only JSON is accepted: a cross-site form can post urlencoded data with the user's cookie,
+    # but a JSON content type needs a CORS preflight, which this app never grants
+    if not request.is_json:
+        return jsonify({'error': 'Expected application/json'}), 415
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Message is required'}), 400
+    message = str(data.get('message') or '').strip()[:SHOUTBOX_MESSAGE_LENGTH]
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+    shout = Shoutbox(user_id=current_user.id, message=message, timestamp=datetime.now().replace(microsecond=0))
+    db.session.add(shout)
+    db.session.commit()
+    shoutbox_hub.notify()
+    return jsonify({'id': shout.id}), 201
+
+@app.route('/api/shoutbox/stream')
+@limiter.limit("20 per minute")
+def shoutbox_stream():
+    # Subscribe before reading the replay, so nothing published in between is lost
+    subscriber = shoutbox_hub.subscribe()
+    if subscriber is None:
+        # EventSource gives up on a 503, and main.js then polls /api/shoutbox instead
+        return jsonify({'error': 'Too many open streams, poll /api/shoutbox instead'}), 503, {
+            'Retry-After': str(SHOUTBOX_STREAM_LIFETIME)
+        }
+    # Replay the newest of the shouts the client missed while reconnecting, as the page shows
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    backlog = []
+    try:
+        if last_event_id is not None:
+            missed = Shoutbox.query.filter(
+                Shoutbox.id > last_event_id
+            ).order_by(Shoutbox.id.desc()).limit(10).all()[::-1]
+            names = user_cache.usernames(item.user_id for item in missed)
+            backlog = [(item.id, serialize_shout(item, names.get(item.user_id), app.json.dumps)) for item in missed]
+    except Exception:
+        shoutbox_hub.unsubscribe(subscriber)
+        raise
+    finally:
+        db.session.remove()
+    # Hub events up to here were already sent by the replay or before the reconnect
+    sent_id = backlog[-1][0] if backlog else (last_event_id or 0)
+
+    def events():
+        deadline = time.monotonic() + SHOUTBOX_STREAM_LIFETIME
+        yield 'retry: 5000\n\n'
+        for event_id, payload in backlog:
+            yield f'id: {event_id}\nevent: shout\ndata: {payload}\n\n'
+        while time.monotonic() < deadline:
+            try:
+                event = subscriber.get(timeout=SHOUTBOX_STREAM_KEEPALIVE)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if event is None:
+                # The hub dropped this client for falling behind; it reconnects with Last-Event-ID
+                return
+            event_id, payload = event
+            if event_id <= sent_id:
+                continue
+            yield f'id: {event_id}\nevent: shout\ndata: {payload}\n\n'
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also runs when the client disconnects before the body starts
+    response.call_on_close(lambda: shoutbox_hub.unsubscribe(subscriber))
+    return response
+
+def latest_posts(post_type, limit):
+    """Serve the newest posts of one type, as listed on the home, marketplace and services pages."""
+    model = POST_TYPES[post_type]
+    tag, last_modified = table_version(model, model.date)
+
+    def build():
+        posts = model.query.order_by(model.date.desc()).limit(limit).all()
+        names = user_cache.usernames(post.user_id for post in posts)
+        return jsonify([dict(serialize_post(post, html=True), username=names.get(post.user_id)) for post in posts])
+    return conditional_response(f'{post_type}-{tag}', last_modified,
+                                lambda: response_cache.get_or_build([model], build))
 
 @app.route('/api/announcements')
 def get_announcements():
-    announcements = Announcement.query.order_by(Announcement.date.desc()).limit(5).all()
-    return jsonify([{
-        'id': item.id,
-        'category': item.category,
-        'title': item.title,
-        'content': item.content,
-        'username': item.author.username,  # Changed from user to author
-        'date': item.date
-    } for item in announcements])
+    return latest_posts('announcements', 5)
 
 @app.route('/api/marketplace')
 def get_marketplace():
-    marketplace = Marketplace.query.order_by(Marketplace.date.desc()).limit(10).all()
-    return jsonify([{
-        'id': item.id,
-        'category': item.category,
-        'title': item.title,
-        'description': item.description.replace('\n', '<br>'),  # Replace newlines for HTML
-        'username': item.author.username,  # Changed from user to author
-        'price': item.price,
-        'date': item.date
-    } for item in marketplace])
+    return latest_posts('marketplace', 10)
 
 @app.route('/api/services')
 def get_services():
-    services = Service.query.order_by(Service.date.desc()).limit(10).all()
-    return jsonify([{
-        'id': item.id,
-        'category': item.category,
-        'title': item.title,
-        'description': item.description,
-        'username': item.author.username,  # Changed from user to author
-        'price': item.price,
-        'date': item.date
-    } for item in services])
+    return latest_posts('services', 10)
 
 @app.route('/api/category_counts')
 def get_category_counts():
-    counts = {
-        'announcements': {
-            'Announcements': Announcement.query.filter_by(category='Announcements').count(),
-            'General': Announcement.query.filter_by(category='General').count(),
-            'MM Service': Announcement.query.filter_by(category='MM Service').count()
-        },
-        'marketplace': {
-            'Buyers': Marketplace.query.filter_by(category='Buyers').count(),
-            'Sellers': Marketplace.query.filter_by(category='Sellers').count()
-        },
-        'services': {
-            'Buy': Service.query.filter_by(category='Buy').count(),
-            'Sell': Service.query.filter_by(category='Sell').count()
-        }
-    }
-    return jsonify(counts)
+    counts = counters.category_counts()
+    for post_type, categories in CATEGORIES.items():
+        for category in categories:
+            counts[post_type].setdefault(category, 0)
+    # The counters table is tiny, so the tag is simply the counts themselves
+    tag = '-'.join(str(counts[post_type][category]) for post_type in sorted(counts) for category in sorted(counts[post_type]))
+    return conditional_response(f'counts-{tag}', None, lambda: jsonify(counts))
+
+@app.cli.command('reconcile-counts')
+def reconcile_counts():
+    """Recompute the cached category counts and report any drift."""
+    drift = counters.reconcile()
+    for (post_type, category), (cached, actual) in sorted(drift.items()):
+        print(f"{post_type}/{category}: cached {cached}, actual {actual}")
+    print(f"Reconciled category counts, {len(drift)} counter(s) drifted")
+
+def serialize_category_post(post, comments, names):
+    """Build the /api/posts listing entry for one post."""
+    data = serialize_post(post, html=True)
+    data['username'] = names.get(post.user_id)
+    data['comments'] = comments.get(post.id, 0)
+    return data
+
+def parse_cursor(cursor):
+    """Split an 'after' cursor of the form '<date>,<id>' into (datetime, id)."""
+    date, _, post_id = cursor.rpartition(',')
+    return datetime.strptime(date, DATE_FORMAT), int(post_id)
 
 @app.route('/api/posts/<post_type>/<category>')
 def get_posts_by_category(post_type, category):
-    page = request.args.get('page', 1, type=int)
+    if post_type not in POST_TYPES:
+        return jsonify({'posts': [], 'total_pages': 0, 'current_page': 1})
+    model = POST_TYPES[post_type]
+    # Comment counts are part of the listing, so new comments invalidate it too
+    return response_cache.get_or_build([model, Comment], lambda: category_listing(post_type, category, model))
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+def category_listing(post_type, category, model):
+    """Build one page of a category listing, by page number or after a keyset cursor."""
     per_page = 10
-    if post_type == 'announcements':
-        posts = Announcement.query.filter_by(category=category).order_by(Announcement.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
-        return jsonify({
-            'posts': [{
-                'id': post.id,
-                'category': post.category,
-                'title': post.title,
-                'content': post.content,
-                'username': post.author.username,  # Changed from user to author
-                'date': post.date,
-                'comments': Comment.query.filter_by(post_type='announcement', post_id=post.id).count()
-            } for post in posts.items],
-            'total_pages': posts.pages,
-            'current_page': posts.page
-        })
-    elif post_type == 'marketplace':
-        posts = Marketplace.query.filter_by(category=category).order_by(Marketplace.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
-        return jsonify({
-            'posts': [{
-                'id': post.id,
-                'category': post.category,
-                'title': post.title,
-                'description': post.description.replace('\n', '<br>'),  # Replace newlines for HTML
-                'username': post.author.username,  # Changed from user to author
-                'price': post.price,
-                'date': post.date,
-                'comments': Comment.query.filter_by(post_type='marketplace', post_id=post.id).count()
-            } for post in posts.items],
-            'total_pages': posts.pages,
-            'current_page': posts.page
-        })
-    elif post_type == 'services':
-        posts = Service.query.filter_by(category=category).order_by(Service.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    # Newest first; id breaks ties so every post has a unique, stable position
+    query = model.query.filter_by(category=category).order_by(model.date.desc(), model.id.desc())
+
+    if 'after' not in request.args:
+        posts = query.paginate(page=request.args.get('page', 1, type=int), per_page=per_page, error_out=False)
+        comments = comment_counts([post.id for post in posts.items])
+        names = user_cache.usernames(post.user_id for post in posts.items)
         return jsonify({
-            'posts': [{
-                'id': post.id,
-                'category': post.category,
-                'title': post.title,
-                'description': post.description,
-                'username': post.author.username,  # Changed from user to author
-                'price': post.price,
-                'date': post.date,
-                'comments': Comment.query.filter_by(post_type='service', post_id=post.id).count()
-            } for post in posts.items],
+            'posts': [serialize_category_post(post, comments, names) for post in posts.items],
             'total_pages': posts.pages,
             'current_page': posts.page
         })
-    return jsonify({'posts': [], 'total_pages': 0, 'current_page': 1})
+
+    # Keyset mode: seek past the cursor on the (category, date) index instead of counting
+    # and skipping OFFSET rows, so every page costs the same and inserts don't shift it
+    cursor = request.args.get('after', '')
+    if cursor:
+        try:
+            after_date, after_id = parse_cursor(cursor)
+        except ValueError:
+            return app.make_response((jsonify({'error': 'Invalid cursor, expected after=<YYYY-MM-DD HH:MM:SS>,<id>'}), 400))
+        query = query.filter(tuple_(model.date, model.id) < (after_date, after_id))
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    comments = comment_counts([post.id for post in items])
+    names = user_cache.usernames(post.user_id for post in items)
+    next_cursor = f'{items[-1].date.strftime(DATE_FORMAT)},{items[-1].id}' if has_more else None
+    # Approximate: read from the category counters rather than counted per request
+    total = counters.category_counts()[post_type].get(category, 0)
+    return jsonify({
+        'posts': [serialize_category_post(post, comments, names) for post in items],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'approximate_total': total,
+        'total_pages': -(-total // per_page)
+    })
 
 @app.route('/api/search', methods=['GET'])
 @login_required
 def search_posts():
     query = request.args.get('query', '')
     post_type = request.args.get('type', '')
-    posts = []
-    if post_type == '' or post_type == 'announcements':
-        announcements = Announcement.query.filter(
-            (Announcement.title.ilike(f'%{query}%')) |
-            (Announcement.content.ilike(f'%{query}%'))
-        ).all()
-        posts.extend([{
-            'id': post.id,
-            'category': post.category,
-            'title': post.title,
-            'content': post.content,
-            'username': post.author.username,  # Changed from user to author
-            'date': post.date,
-            'post_type': 'announcements'
-        } for post in announcements])
-    if post_type == '' or post_type == 'marketplace':
-        marketplace = Marketplace.query.filter(
-            (Marketplace.title.ilike(f'%{query}%')) |
-            (Marketplace.description.ilike(f'%{query}%'))
-        ).all()
-        posts.extend([{
-            'id': post.id,
-            'category': post.category,
-            'title': post.title,
-            'description': post.description.replace('\n', '<br>'),  # Replace newlines for HTML
-            'username': post.author.username,  # Changed from user to author
-            'price': post.price,
-            'date': post.date,
-            'post_type': 'marketplace'
-        } for post in marketplace])
-    if post_type == '' or post_type == 'services':
-        services = Service.query.filter(
-            (Service.title.ilike(f'%{query}%')) |
-            (Service.description.ilike(f'%{query}%'))
-        ).all()
-        posts.extend([{
-            'id': post.id,
-            'category': post.category,
-            'title': post.title,
-            'description': post.description,
-            'username': post.author.username,  # Changed from user to author
-            'price': post.price,
-            'date': post.date,
-            'post_type': 'services'
-        } for post in services])
-    return jsonify(posts)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    if post_type not in ('', 'announcements', 'marketplace', 'services'):
+        return jsonify([])
+    ids = search_index.search(query, post_type, limit=limit, offset=offset)
+
+    # Load the matched posts with one query, then emit them in rank order
+    found = {post.id: post for post in Post.query.filter(Post.id.in_(ids))} if ids else {}
+    posts = [found[post_id] for post_id in ids if post_id in found]
+    names = user_cache.usernames(post.user_id for post in posts)
+    return jsonify([dict(serialize_post(post, html=True), username=names.get(post.user_id), post_type=post.post_type)
+                    for post in posts])
+
+# Tables served by /api/export; users leave out the password hash
+EXPORTS = {
+    'posts': Post.__table__.c,
+    'comments': Comment.__table__.c,
+    'shoutbox': Shoutbox.__table__.c,
+    'users': [User.__table__.c.id, User.__table__.c.username, User.__table__.c.avatar],
+}
+app.config.setdefault('EXPORT_BATCH_SIZE', 1000)
+
+def writes_in_flight():
+    response = jsonify({'error': 'Waiting for other writes to commit, try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.route('/api/export/<table>')
+@login_required
+def export_table(table):
+    """Stream every row of a table with an id above since as newline-delimited JSON, in id order."""
+    if table not in EXPORTS:
+        return jsonify({'error': f"Unknown table, expected one of {', '.join(EXPORTS)}"}), 404
+    columns = list(EXPORTS[table])
+    id_column = columns[0].table.c.id
+    since = max(request.args.get('since', 0, type=int), 0)
+    # Rows committed while the export runs are left for the next pull, which starts here
+    try:
+        watermark = database.settled_ids(db.session.connection(), [id_column.table])[id_column.table]
+    except database.WritesInFlight:
+        return writes_in_flight()
+    finally:
+        db.session.close()
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+    dumps = app.json.dumps
+
+    def rows():
+        last_id = since
+        while last_id < watermark:
+            # Keyset batches on the primary key: each one is an index range read, and only one
+            # batch is held in memory however large the table is
+            batch = db.session.execute(
+                select(*columns).where(id_column > last_id, id_column <= watermark).order_by(id_column).limit(batch_size)
+            ).mappings().all()
+            # Hand the connection back between batches instead of holding it for the whole export
+            db.session.close()
+            if not batch:
+                break
+            yield ''.join(dumps(dict(row)) + '\n' for row in batch)
+            last_id = batch[-1]['id']
+
+    return Response(stream_with_context(rows()), mimetype='application/x-ndjson', headers={
+        'X-Export-Watermark': str(watermark),
+        'X-Accel-Buffering': 'no'
+    })
+
+# Tables followed by /api/changes, in the order their cursor positions are written
+CHANGE_FEED_TABLES = ['posts', 'comments', 'shoutbox']
+
+def parse_change_cursor(cursor):
+    """Split a cursor of the form 'posts:12,comments:340,shoutbox:7' into {table: last id}."""
+    positions = {}
+    for part in cursor.split(','):
+        table, _, last_id = part.partition(':')
+        if table not in CHANGE_FEED_TABLES:
+            raise ValueError(table)
+        positions[table] = int(last_id)
+    return positions
+
+def format_change_cursor(positions):
+    return ','.join(f'{table}:{positions[table]}' for table in CHANGE_FEED_TABLES)
+
+@app.route('/api/changes')
+@login_required
+def change_feed():
+    """Return the rows added to each followed table since the cursor, and the cursor to poll with next."""
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    cursor = request.args.get('cursor')
+    try:
+        positions = dict.fromkeys(CHANGE_FEED_TABLES, 0)
+        if cursor:
+            positions.update(parse_change_cursor(cursor))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor, expected <table>:<id> pairs separated by commas'}), 400
+    # Never move a cursor past an id that a running transaction could still commit below
+    try:
+        settled = database.settled_ids(
+            db.session.connection(), [EXPORTS[table].id.table for table in CHANGE_FEED_TABLES]
+        )
+    except database.WritesInFlight:
+        return writes_in_flight()
+    if not cursor:
+        # No cursor: start following from the newest rows
+        positions = {table: settled[EXPORTS[table].id.table] for table in CHANGE_FEED_TABLES}
+        return jsonify({'changes': [], 'cursor': format_change_cursor(positions), 'has_more': False})
+
+    # One seek per table on its primary key, so a poll costs O(new rows) however large the tables are
+    changes = []
+    has_more = False
+    for table in CHANGE_FEED_TABLES:
+        columns = EXPORTS[table]
+        rows = db.session.execute(
+            select(*columns).where(
+                columns.id > positions[table], columns.id <= settled[columns.id.table]
+            ).order_by(columns.id).limit(limit + 1)
+        ).mappings().all()
+        if len(rows) > limit:
+            has_more = True
+            rows = rows[:limit]
+        if rows:
+            positions[table] = rows[-1]['id']
+        changes.extend(dict(row, type=table) for row in rows)
+    names = user_cache.usernames(change['user_id'] for change in changes)
+    for change in changes:
+        change['username'] = names.get(change['user_id'])
+    return jsonify({'changes': changes, 'cursor': format_change_cursor(positions), 'has_more': has_more})
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Create the full-text search index if needed and re-index every post."""
+    with db.engine.begin() as connection:
+        search_index.create(connection)
+        count = search_index.rebuild(connection)
+    print(f"Indexed {count} posts")
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Create missing tables and apply pending schema migrations in place."""
+    applied = migrations.upgrade()
+    print(f"Applied migrations: {applied}" if applied else f"Database is at schema version {migrations.LATEST_VERSION}")
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrations.upgrade()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,108 @@
+# bench_db.py
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import database
+
+# Reads shaped like the API's hottest queries: a category page, the newest listings, a comment count
+READ_QUERIES = [
+    text("SELECT id, title, user_id, date FROM post WHERE post_type = 'marketplace' AND category = 'Sellers' "
+         "ORDER BY date DESC, id DESC LIMIT 10 OFFSET 10"),
+    text("SELECT id, title, user_id, date FROM post WHERE post_type = 'announcements' ORDER BY date DESC LIMIT 5"),
+    text("SELECT post_id, count(id) FROM comment WHERE post_id IN (1, 2, 3, 4, 5) GROUP BY post_id"),
+]
+INSERT = text("INSERT INTO post (post_type, category, title, body, user_id, price, date) "
+              "VALUES ('marketplace', 'Sellers', :title, 'benchmark row', 1, '$1', :date)")
+
+
+def reader(path, profile, deadline, results):
+    engine = database.make_engine(f'sqlite:///{path}', profile)
+    reads = errors = 0
+    latencies = []
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            with engine.connect() as connection:
+                for query in READ_QUERIES:
+                    connection.execute(query).all()
+            reads += 1
+            latencies.append(time.monotonic() - started)
+        except OperationalError:
+            errors += 1
+    results.put(('read', reads, errors, latencies))
+
+
+def writer(path, profile, deadline, batch, results):
+    engine = database.make_engine(f'sqlite:///{path}', profile)
+    rows = errors = 0
+    while time.monotonic() < deadline:
+        now = datetime.now()
+        try:
+            with engine.begin() as connection:
+                connection.execute(INSERT, [{'title': f'bench {rows + n}', 'date': now} for n in range(batch)])
+            rows += batch
+        except OperationalError:
+            errors += 1
+    results.put(('write', rows, errors, []))
+
+
+def run(source, profile, readers, writers, duration, batch):
+    """Benchmark one profile on a scratch copy of the database and return its summary."""
+    workdir = tempfile.mkdtemp(prefix='bench_db_')
+    path = os.path.join(workdir, 'database.db')
+    try:
+        shutil.copy(source, path)
+        # journal_mode is stored in the file, so put the copy into the profile's mode up front
+        connection = sqlite3.connect(path)
+        connection.execute('PRAGMA journal_mode = WAL' if profile == 'wal' else 'PRAGMA journal_mode = DELETE')
+        connection.close()
+
+        results = multiprocessing.Queue()
+        deadline = time.monotonic() + duration
+        processes = [multiprocessing.Process(target=reader, args=(path, profile, deadline, results)) for _ in range(readers)]
+        processes += [multiprocessing.Process(target=writer, args=(path, profile, deadline, batch, results)) for _ in range(writers)]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(latency for kind, _, _, samples in collected if kind == 'read' for latency in samples)
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    return {
+        'profile': profile,
+        'reads_per_s': sum(count for kind, count, _, _ in collected if kind == 'read') / duration,
+        'rows_per_s': sum(count for kind, count, _, _ in collected if kind == 'write') / duration,
+        'read_p95_ms': p95,
+        'errors': sum(errors for _, _, errors, _ in collected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite connection profiles under concurrent reads and writes.")
+    parser.add_argument('--database', default=os.path.join('instance', 'database.db'), help="Database to copy for each run")
+    parser.add_argument('--profiles', nargs='+', default=sorted(database.SQLITE_PROFILES), choices=sorted(database.SQLITE_PROFILES))
+    parser.add_argument('--readers', type=int, default=4, help="Reader processes, standing in for gunicorn workers")
+    parser.add_argument('--writers', type=int, default=1, help="Writer processes, standing in for the simulators")
+    parser.add_argument('--batch', type=int, default=20, help="Rows per write transaction")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per profile")
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'reads/s':>10} {'rows/s':>10} {'read p95 ms':>12} {'errors':>7}")
+    for profile in args.profiles:
+        result = run(args.database, profile, args.readers, args.writers, args.duration, args.batch)
+        print(f"{result['profile']:<8} {result['reads_per_s']:>10.0f} {result['rows_per_s']:>10.0f} "
+              f"{result['read_p95_ms']:>12.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+# bench_views.py
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Micro-benchmarks for the views that dominate request cost, run against seeded fixture databases.
+# Query counts and full table scans do not depend on the machine, so any increase over the
+# baseline fails the run; timings only fail when --max-slowdown is given.
+
+# Fixture name -> populate_db.py --bulk row counts. The post counts are per category, so each
+# fixture's posts are split about evenly over the three post types and their 3, 2 and 2 categories.
+# The 1k fixture has few users so that DarkHacker still has several profile pages.
+FIXTURES = {
+    '1k': {'users': 20, 'shoutbox': 100, 'announcements': 111, 'marketplace': 167, 'services': 167},
+    '100k': {'users': 2000, 'shoutbox': 1000, 'announcements': 11111, 'marketplace': 16667, 'services': 16667},
+    '1m': {'users': 10000, 'shoutbox': 10000, 'announcements': 111111, 'marketplace': 166667, 'services': 166667},
+}
+FIXTURE_SEED = 'bench'
+FIXTURE_ANCHOR = '2025-01-01T00:00:00'
+FIXTURE_DIR = os.path.join('instance', 'bench')
+
+# name -> URL, requested as user 1 (DarkHacker, the first seeded account)
+CASES = {
+    'category_page': '/api/posts/marketplace/Sellers?page=1',
+    'category_deep_page': '/api/posts/marketplace/Sellers?page=15',  # the 1k fixture's Sellers has 17 pages
+    'category_keyset': '/api/posts/marketplace/Sellers?after=',
+    'search': '/api/search?query=RDP&type=',
+    'search_typed': '/api/search?query=phishing&type=services',
+    'search_empty': '/api/search?query=&type=',
+    'post_detail': '/api/post/announcements/1',
+    'profile_detail': '/profile/DarkHacker',
+    'profile_deep_page': '/profile/DarkHacker?page=3&comments_page=3',  # both lists have 3+ pages in every fixture
+    'category_counts': '/api/category_counts',
+}
+
+# Tables small enough by design that scanning them is fine
+SMALL_TABLES = {'category_count', 'cache_generation', 'schema_version'}
+
+
+def fixture_path(name):
+    return os.path.abspath(os.path.join(FIXTURE_DIR, f'{name}.db'))
+
+
+def build_fixture(name):
+    """Create a fixture database with the bulk loader unless it already exists."""
+    path = fixture_path(name)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    counts = FIXTURES[name]
+    command = [sys.executable, 'populate_db.py', '--bulk', '--seed', FIXTURE_SEED, '--anchor', FIXTURE_ANCHOR]
+    for option, value in counts.items():
+        command += [f'--{option}', str(value)]
+    print(f"Building {name} fixture at {path}", file=sys.stderr)
+    subprocess.run(command, check=True, env=dict(os.environ, DATABASE_URL=f'sqlite:///{path}'),
+                   stdout=subprocess.DEVNULL)
+    return path
+
+
+def table_scans(connection, statements, tables):
+    """Return the tables that SQLite reads in full, without an index, for any of the statements.
+
+    Scans of subqueries (a UNION or a derived table) only read the rows they produced and are
+    not counted, so only names in tables are reported.
+    """
+    scans = set()
+    for statement, parameters in statements:
+        for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+            detail = row[-1]
+            if (detail.startswith('SCAN ') and ' USING ' not in detail
+                    and 'VIRTUAL TABLE' not in detail and detail != 'SCAN CONSTANT ROW'):
+                table = detail.split()[1]
+                if table in tables and table not in SMALL_TABLES:
+                    scans.add(table)
+    return sorted(scans)
+
+
+def run_cases(iterations, warmup):
+    """Time every case in this process; DATABASE_URL must already point at the fixture."""
+    from sqlalchemy import event
+    from app import app, db, limiter, response_cache, user_cache
+
+    # Iterations would run into the per-IP limits long before they measured anything
+    limiter.enabled = False
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, parameters, context, executemany: statements.append((statement, parameters)))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    results = {}
+    for name, url in CASES.items():
+        timings = []
+        queries = 0
+        scans = []
+        for iteration in range(warmup + iterations):
+            # Measure the view itself, not the caches in front of it
+            response_cache.clear()
+            user_cache.invalidate()
+            statements.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f"{name}: {url} returned {response.status_code}")
+            if iteration == 0:
+                executed = list(statements)
+                queries = len(executed)
+                with engine.connect() as connection:
+                    scans = table_scans(connection, executed, set(db.metadata.tables))
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+        timings.sort()
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'queries': queries,
+            'table_scans': scans,
+        }
+    return results
+
+
+def run_fixture(name, iterations, warmup):
+    """Run the cases against one fixture in a fresh interpreter, since app.py binds its database at import."""
+    path = build_fixture(name)
+    command = [sys.executable, __file__, '--worker', '--iterations', str(iterations), '--warmup', str(warmup)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f'sqlite:///{path}'))
+    return json.loads(output.stdout)
+
+
+def compare(results, baseline, max_slowdown):
+    """Return a list of regressions of results against baseline."""
+    failures = []
+    for fixture, cases in results.items():
+        for name, result in cases.items():
+            expected = baseline.get(fixture, {}).get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                failures.append(f"{fixture}/{name}: {result['queries']} queries, baseline {expected['queries']}")
+            new_scans = set(result['table_scans']) - set(expected['table_scans'])
+            if new_scans:
+                failures.append(f"{fixture}/{name}: full table scan of {', '.join(sorted(new_scans))}")
+            if max_slowdown and result['median_ms'] > expected['median_ms'] * max_slowdown:
+                failures.append(f"{fixture}/{name}: median {result['median_ms']:.1f} ms, baseline {expected['median_ms']:.1f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot views against fixture databases and compare with a baseline.")
+    parser.add_argument('--fixtures', nargs='+', default=['1k', '100k'], choices=list(FIXTURES),
+                        help="Fixture sizes to run (1m takes a few minutes to build the first time)")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare with a results file written by --output")
+    parser.add_argument('--max-slowdown', type=float,
+                        help="Also fail when a median is this many times the baseline's (timings vary by machine)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_cases(args.iterations, args.warmup), sys.stdout)
+        return
+
+    results = {name: run_fixture(name, args.iterations, args.warmup) for name in args.fixtures}
+    print(f"{'fixture':<8} {'case':<20} {'median ms':>10} {'p95 ms':>8} {'queries':>8}  table scans")
+    for fixture, cases in results.items():
+        for name, result in cases.items():
+            print(f"{fixture:<8} {name:<20} {result['median_ms']:>10.2f} {result['p95_ms']:>8.2f} "
+                  f"{result['queries']:>8}  {', '.join(result['table_scans']) or '-'}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.max_slowdown)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# captcha_pool.py
+import logging
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from captcha.image import ImageCaptcha
+from per_process import PerProcess
+
+logger = logging.getLogger(__name__)
+
+
+class CaptchaPool:
+    """Keeps a pool of pre-rendered CAPTCHAs in memory so the login page never renders one inline.
+
+    A background thread tops the pool up to size entries and throws away entries older than
+    max_age, so a scraper fetching the login page cannot drain it faster than it is refilled
+    without falling back to inline rendering (counted as a miss). Issued images are held for
+    expiry seconds under a random token and served from memory; nothing is written to disk.
+    """
+
+    def __init__(self, fonts, length=6, chars='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+                 size=50, max_age=600, expiry=300, width=200, height=60):
+        self.length = length
+        self.chars = chars
+        self.size = size
+        self.max_age = max_age
+        self.expiry = expiry
+        self._image = ImageCaptcha(fonts=fonts, width=width, height=height)
+        self._render_lock = threading.Lock()
+        self._pool = deque()
+        self._issued = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._filler = PerProcess(self._start_filler)
+        self._random = random.SystemRandom()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def render(self, code):
+        """Render code as PNG bytes; ImageCaptcha is not safe to share between threads."""
+        with self._render_lock:
+            return self._image.generate(code).getvalue()
+
+    def _new_code(self):
+        return ''.join(self._random.choice(self.chars) for _ in range(self.length))
+
+    def issue(self):
+        """Take a CAPTCHA for a login form and return (token, code)."""
+        self._filler.get()
+        now = time.monotonic()
+        entry = None
+        with self._lock:
+            while self._pool:
+                code, png, created = self._pool.popleft()
+                if now - created < self.max_age:
+                    entry = code, png
+                    break
+                self.expired += 1
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._wakeup.set()
+        if entry:
+            code, png = entry
+        else:
+            code = self._new_code()
+            png = self.render(code)
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            # Drop images nobody fetched in time before adding the new one
+            for stale in [t for t, (_, expires) in self._issued.items() if expires <= now]:
+                del self._issued[stale]
+            self._issued[token] = (png, now + self.expiry)
+        return token, code
+
+    def image(self, token):
+        """Return the PNG issued under token, or None if it expired or was issued by another process."""
+        with self._lock:
+            png, expires = self._issued.get(token, (None, 0))
+        return png if expires > time.monotonic() else None
+
+    def discard(self, token):
+        with self._lock:
+            self._issued.pop(token, None)
+
+    def stats(self):
+        """Counters for this process: pool hits, misses (rendered inline) and entries aged out."""
+        with self._lock:
+            return {
+                'pool_size': len(self._pool),
+                'pool_target': self.size,
+                'issued': len(self._issued),
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+            }
+
+    def _start_filler(self):
+        # Each gunicorn worker fills its own pool
+        with self._lock:
+            self._pool.clear()
+            self._issued.clear()
+        thread = threading.Thread(target=self._run, name='captcha-pool', daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                while self._pool and now - self._pool[0][2] >= self.max_age:
+                    self._pool.popleft()
+                    self.expired += 1
+                missing = self.size - len(self._pool)
+                oldest = self._pool[0][2] if self._pool else now
+            try:
+                for _ in range(missing):
+                    code = self._new_code()
+                    png = self.render(code)
+                    with self._lock:
+                        self._pool.append((code, png, time.monotonic()))
+            except Exception as e:
+                logger.error(f"CAPTCHA pool refill failed: {str(e)}")
+            # Sleep until something is taken or the oldest entry ages out
+            self._wakeup.wait(max(1.0, self.max_age - (time.monotonic() - oldest)))
+            self._wakeup.clear()
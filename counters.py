@@ -0,0 +1,76 @@
+# counters.py
+import logging
+from sqlalchemy import event, func
+import database
+from models import db, Post, Announcement, Marketplace, Service, CategoryCount
+
+logger = logging.getLogger(__name__)
+
+# Post types whose rows are counted per category
+POST_TYPES = [model.__mapper__.polymorphic_identity for model in (Announcement, Marketplace, Service)]
+
+
+def _bump(connection, post_type, category, delta):
+    """Adjust one counter inside the transaction that inserted or deleted the post."""
+    table = CategoryCount.__table__
+    database.upsert(connection, table, {'post_type': post_type, 'category': category, 'count': max(delta, 0)},
+                    {'count': table.c.count + delta})
+
+
+@event.listens_for(Post, 'after_insert', propagate=True)
+def _after_insert(mapper, connection, target):
+    _bump(connection, target.post_type, target.category, 1)
+
+
+@event.listens_for(Post, 'after_delete', propagate=True)
+def _after_delete(mapper, connection, target):
+    _bump(connection, target.post_type, target.category, -1)
+
+
+def category_counts():
+    """Return {post_type: {category: count}} from the counters table with a single query."""
+    counts = {post_type: {} for post_type in POST_TYPES}
+    for row in CategoryCount.query.all():
+        counts.setdefault(row.post_type, {})[row.category] = row.count
+    return counts
+
+
+def rebuild(connection):
+    """Replace every counter with an exact count computed from the post table."""
+    table = CategoryCount.__table__
+    connection.execute(table.delete())
+    rows = connection.execute(
+        db.select(Post.post_type, Post.category, func.count(Post.id))
+        .where(Post.category.isnot(None)).group_by(Post.post_type, Post.category)
+    ).all()
+    if rows:
+        connection.execute(table.insert(), [
+            {'post_type': post_type, 'category': category, 'count': count} for post_type, category, count in rows
+        ])
+
+
+def reconcile():
+    """Recompute exact counts from the post table, fix the counters and return the drift.
+
+    Drift is {(post_type, category): (cached, actual)} for every counter that was wrong.
+    Must be called inside an app context.
+    """
+    cached = {(row.post_type, row.category): row.count for row in CategoryCount.query.all()}
+    rows = db.session.query(Post.post_type, Post.category, func.count(Post.id)).group_by(Post.post_type, Post.category).all()
+    actual = {(post_type, category): count for post_type, category, count in rows if category is not None}
+
+    drift = {}
+    for key in cached.keys() | actual.keys():
+        if cached.get(key, 0) != actual.get(key, 0):
+            drift[key] = (cached.get(key, 0), actual.get(key, 0))
+    for (post_type, category), (_, count) in drift.items():
+        row = db.session.get(CategoryCount, (post_type, category))
+        if row is None:
+            db.session.add(CategoryCount(post_type=post_type, category=category, count=count))
+        else:
+            row.count = count
+    db.session.commit()
+
+    for (post_type, category), (was, now) in drift.items():
+        logger.warning(f"Category count drift for {post_type}/{category}: cached {was}, actual {now}")
+    return drift
@@ -0,0 +1,145 @@
+# database.py
+import os
+import time
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Engine configuration shared by app.py, populate_db.py, simulator.py and bench_db.py, so every
+# process that opens the database does so the same way. DATABASE_URL selects the backend, e.g.
+# postgresql+psycopg2://forum:forum@db:5432/forum; without it the forum uses instance/database.db.
+DEFAULT_DATABASE_URI = 'sqlite:///database.db'
+DATABASE_URI = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URI)
+if DATABASE_URI.startswith('postgres://'):
+    # The scheme many hosting providers hand out; SQLAlchemy only accepts postgresql://
+    DATABASE_URI = 'postgresql://' + DATABASE_URI[len('postgres://'):]
+
+# Connection pragmas per profile, applied to every new SQLite connection. Select one with the
+# SQLITE_PROFILE environment variable.
+#   wal     - readers never wait for the writer and the writer only waits busy_timeout ms for
+#             another writer instead of failing with "database is locked"
+#   legacy  - SQLite's defaults (rollback journal, the driver's 5 second timeout), kept for comparison
+SQLITE_PROFILES = {
+    'wal': [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),   # WAL stays consistent after a crash; only the last commits can be lost
+        ('busy_timeout', '5000'),
+        ('cache_size', '-65536'),    # 64 MiB page cache per connection
+        ('mmap_size', '268435456'),  # read through a 256 MiB memory map instead of read() calls
+        ('temp_store', 'MEMORY'),
+    ],
+    'legacy': [],
+}
+DEFAULT_PROFILE = 'wal'
+
+# Pool sizes per process: gunicorn threads share one pool per worker. On a server database,
+# size them so that containers x workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays below its
+# max_connections.
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+POOL_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+POOL_RECYCLE = 1800  # seconds; drop server connections before idle timeouts in between do
+
+
+def current_profile():
+    profile = os.environ.get('SQLITE_PROFILE', DEFAULT_PROFILE)
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE '{profile}', expected one of {', '.join(SQLITE_PROFILES)}")
+    return profile
+
+
+def is_sqlite(bind):
+    """Return True if the engine or connection talks to SQLite."""
+    return bind.dialect.name == 'sqlite'
+
+
+def upsert(connection, table, values, updates):
+    """Insert values as a new row of table or, if a row with that primary key exists, apply updates to it.
+
+    One INSERT ... ON CONFLICT DO UPDATE, which SQLite and PostgreSQL both run atomically, so two
+    transactions creating the same row cannot both miss it and collide on the insert. Columns of
+    table in updates read the existing row.
+    """
+    insert = sqlite_insert if is_sqlite(connection) else postgresql_insert
+    connection.execute(
+        insert(table).values(**values).on_conflict_do_update(index_elements=list(table.primary_key), set_=updates)
+    )
+
+
+class WritesInFlight(Exception):
+    """Raised when transactions that may still commit rows below the current ids did not finish in time."""
+
+
+def settled_ids(connection, tables, timeout=2.0):
+    """Return {table: id} such that no row with that id or a lower one can still be committed.
+
+    Readers that follow a table by "id above the last one seen" may only move up to this id.
+    SQLite runs one write transaction at a time, so rows become visible in id order and the
+    highest committed id is settled. PostgreSQL sequences hand out ids outside transactions, so
+    one holding a lower id can commit after one holding a higher id has become visible. Every id
+    up to a sequence's current value was taken by a transaction that has finished or is running
+    now; once those running now have finished, nothing more can appear up to that value.
+    """
+    if is_sqlite(connection):
+        return {table: connection.execute(select(func.max(table.c.id))).scalar() or 0 for table in tables}
+    bounds = {table: connection.execute(
+        text("SELECT pg_sequence_last_value(pg_get_serial_sequence(:table, 'id'))"), {'table': table.name}
+    ).scalar() or 0 for table in tables}
+    # Every write transaction holds a lock on its own id until it ends. Read after the sequences,
+    # so these cover every other transaction that took one of those ids.
+    running_sql = (
+        "SELECT CAST(transactionid AS text) FROM pg_locks WHERE locktype = 'transactionid' "
+        "AND mode = 'ExclusiveLock' AND pid IS DISTINCT FROM pg_backend_pid()"
+    )
+    running = connection.execute(text(running_sql)).scalars().all()
+    deadline = time.monotonic() + timeout
+    while running:
+        if time.monotonic() > deadline:
+            raise WritesInFlight(f"{len(running)} write transactions still running after {timeout}s")
+        time.sleep(0.005)
+        running = connection.execute(
+            text(running_sql + " AND CAST(transactionid AS text) = ANY(:running)"), {'running': running}
+        ).scalars().all()
+    return bounds
+
+
+def apply_pragmas(dbapi_connection, profile=None):
+    """Run the profile's pragmas on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PROFILES[profile or current_profile()]:
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def engine_options(uri=DATABASE_URI):
+    """Keyword arguments for create_engine / SQLALCHEMY_ENGINE_OPTIONS."""
+    options = {'pool_size': POOL_SIZE, 'max_overflow': POOL_OVERFLOW}
+    if not uri.startswith('sqlite'):
+        # Survive database restarts and failovers without handing out dead connections
+        options.update(pool_pre_ping=True, pool_recycle=POOL_RECYCLE)
+    return options
+
+
+def tune_engine(engine, profile=None):
+    """Apply the profile's pragmas to every connection the engine opens."""
+    if not is_sqlite(engine):
+        return engine
+    profile = profile or current_profile()
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, profile))
+    return engine
+
+
+def make_engine(uri=DATABASE_URI, profile=None):
+    """Create a tuned engine outside Flask, e.g. for benchmarks."""
+    return tune_engine(create_engine(uri, **engine_options(uri)), profile)
+
+
+def init_app(app, db):
+    """Point a Flask app at the forum database with the shared engine configuration."""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', DATABASE_URI)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    db.init_app(app)
+    with app.app_context():
+        tune_engine(db.engine)
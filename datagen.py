@@ -0,0 +1,320 @@
+# datagen.py
+import logging
+import random
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Synthetic forum content shared by populate_db.py and the simulators. Every function draws from
+# an explicit random.Random instance, so a given seed (and anchor time) reproduces the same data.
+
+
+def make_rng(seed=None, shard=None):
+    """Return a Random instance; shards of one seeded run get independent, reproducible streams."""
+    if seed is None:
+        return random.Random()
+    return random.Random(f'{seed}' if shard is None else f'{seed}:{shard}')
+
+
+# Seeded runs count back from a fixed time, so the same seed gives the same rows on any day
+SEEDED_ANCHOR = datetime(2025, 1, 1)
+
+
+def default_anchor(seeded=False):
+    """Time that generated dates count back from: now, or SEEDED_ANCHOR for seeded runs."""
+    return SEEDED_ANCHOR if seeded else datetime.now().replace(microsecond=0)
+
+
+def split_count(total, shards, shard):
+    """Rows of a table that belong to one shard; shards differ in size by at most one row."""
+    return total // shards + (1 if shard < total % shards else 0)
+
+
+def generate_text(template, replacements, rng=random):
+    """Generate text by replacing placeholders in template with random choices from replacements."""
+    try:
+        text = template
+        for key, values in replacements.items():
+            text = text.replace(f"{{{key}}}", rng.choice(values))
+        return text.strip()
+    except Exception as e:
+        logger.error(f"Error generating text for template '{template}': {str(e)}")
+        return "Generated text error"
+
+# 10 seeded user profiles: (username, password, avatar)
+USERS = [
+    ('DarkHacker', 'pass123', 'darkhacker.jpg'),
+    ('CyberGhost', 'ghost456', 'cyberghost.jpg'),
+    ('ShadowV', 'shadow789', 'shadowv.jpg'),
+    ('AnonX', 'anon101', 'anonx.jpg'),
+    ('N3tRunn3r', 'runner202', 'netrunner.jpg'),
+    ('Crypt0King', 'king303', 'cryptoking.jpg'),
+    ('ZeroByte', 'zero404', 'zerobyte.jpg'),
+    ('HackSavvy', 'savvy505', 'hacksavvy.jpg'),
+    ('GhostRider', 'rider606', 'ghostrider.jpg'),
+    ('DataViper', 'viper707', 'dataviper.jpg'),
+]
+
+
+# Generate timestamps (within last 30 days of anchor)
+def random_timestamp(rng, anchor):
+    days_ago = rng.randint(0, 30)
+    hours_ago = rng.randint(0, 23)
+    minutes_ago = rng.randint(0, 59)
+    seconds_ago = rng.randint(0, 59)
+    return (anchor - timedelta(days=days_ago, hours=hours_ago, minutes=minutes_ago, seconds=seconds_ago)).replace(microsecond=0)
+
+# Templates and replacements for text generation
+shoutbox_templates = [
+    "New {item} drop in {place}!",
+    "Looking for {item}, PM me!",
+    "Anyone got {item} for sale?",
+    "Fresh {item} available, DM for details!"
+]
+shoutbox_replacements = {
+    "item": ["CC dumps", "PayPal accounts", "phishing kits", "DDoS service", "malware"],
+    "place": ["marketplace", "services", "dark pool"]
+}
+announcement_templates = {
+    "title": [
+        "{action} {item}",
+        "{item} {status} Update",
+        "New {item} Guidelines",
+        "Discuss {item} Trends"
+    ],
+    "content": [
+        "{action} {item}. Contact me for details.",
+        "Recent {item} trends show {status}. Share your thoughts!",
+        "Offering {service} for secure {item} deals. PM to join.",
+        "Tips: Always verify {item} before trading."
+    ]
+}
+announcement_replacements = {
+    "action": ["New rules for", "Tips for trading", "Offering", "Discussing"],
+    "item": ["data breaches", "phishing kits", "escrow services", "cyber-crime tools"],
+    "status": ["increased activity", "new methods", "high demand", "stricter rules"],
+    "service": ["middleman services", "secure deals", "escrow", "verification"]
+}
+marketplace_templates = {
+    "title": {
+        "Buyers": [
+            "Need {item}, High Budget",
+            "Looking for {item}",
+            "Buying Fresh {item}",
+            "Seeking {item} ASAP"
+        ],
+        "Sellers": [
+            "Selling {item}",
+            "Fresh {item} Available",
+            "{item} for Sale, {status}",
+            "High-Quality {item} Drop"
+        ]
+    },
+    "description": {
+        "Buyers": [
+            "Looking for {item}, willing to pay {price}. PM with offers.",
+            "Need clean {item}, urgent. DM me for details.",
+            "Seeking reliable {item} source, escrow available.",
+            "Buying {item}, top dollar for quality."
+        ],
+        "Sellers": [
+            "Selling {item}, high quality, {status}. PM for details.",
+            "Fresh batch of {item}, ready to use. Contact me!",
+            "{item} available, {status}. Escrow accepted.",
+            "High-validity {item}, bulk discounts available."
+        ]
+    }
+}
+marketplace_replacements = {
+    "item": ["CC dumps", "PayPal accounts", "gift card codes", "data leaks", "RDP credentials", "VPN logins"],
+    "status": ["clean and verified", "high balance", "freshly obtained", "limited stock"],
+    "price": ["$100-$500", "$50-$200", "negotiable", "top dollar"]
+}
+iab_marketplace_templates = {
+    "title": ["Access to {company} Network", "Selling {company} Credentials", "{company} IAB Drop"],
+    "description": ["Compromised {company} access, {status}. PM for secure deal.", "Selling {company} network credentials, clean. Escrow only."]
+}
+iab_replacements = {
+    "company": ["Acme Corp", "TechTrend Inc", "GlobalSys Ltd", "DataCore Solutions"],
+    "status": ["verified admin access", "full network control", "recent breach", "exclusive access"]
+}
+# Predefined IAB posts for Sellers
+predefined_iab_posts = [
+    {
+        "title": "TD Bank RDP Access",
+        "description": "Company: TD Bank\nRevenue: $1.64 billion\nIndustry: Banking\nAccess type: RDP\nPrice: DM me for price, serious buyers only, MM accepted",
+        "price": "DM for price"
+    },
+    {
+        "title": "Selling SMB Access to RBC Bank",
+        "description": "Selling SMB access to RBC bank\nRevenue: $5.21\nIndustry: Banking\nCusomters: over 10 million\nCountry: Canada\n\n$12,000 Price is non-negotiatiable, dm me",
+        "price": "$12000"
+    },
+    {
+        "title": "Capital Freight Co. Access",
+        "description": "Selling access to Capital Freight Co. (Texas-based logistics)\nRevenue: ~$900M\nAccess: Full RDP, domain admin via svc_x backup creds\nExtras: Internal invoices, mapped drives, Outlook web creds\nEDR: minimal – Defender only\nPrice: 0.6 BTC firm, BTC only, DM me quick",
+        "price": "0.6 BTC"
+    },
+    {
+        "title": "AspenWell 生物科技有限公司 访问",
+        "description": "公司：AspenWell Biotech Ltd\n地点：荷兰\n收入：$1.3 亿美元\n访问类型：VPN > 内部 RDP > DA\n额外信息：SharePoint 暴露，部署了 RMM 代理\n安全：内部无防病毒软件，未触发日志\n价格：1.05 BTC，支持 escrow 支付（需与卖家协商）\n仅向一名买家出售。",
+        "price": "1.05 BTC"
+    },
+    {
+        "title": "GLOBEX Holdings VPN Access",
+        "description": "got corp vpn + psremote into GLOBEX Holdings, some UK fintech trash\nDA rights, creds pulled from exposed git repo (lol)\nno EDR, just weak-ass AV. internal docs and finance data wide open\nnot waitin long. 0.7 BTC. msg only if u got coin",
+        "price": "0.7 BTC"
+    },
+    {
+        "title": "Arctic Foods Group RDP Access",
+        "description": "ACCESS TO ARCTIC FOODS GROUP\n– Canada HQ’d food distributor\n– RDP w/ DA, access stable 4 days\n– billing, inventory, HR PDFs open\n– Sophos AV but neutered\nRevenue: 2.1B CAD\nPrice: 1.2 BTC\nFAST BUYERS ONLY. No vouches, no timewasters.",
+        "price": "1.2 BTC"
+    },
+    {
+        "title": "Silverline Capital Partners Access",
+        "description": "Company: Silverline Capital Partners (NY Private Equity firm)\nRevenue: approx $500M AUM\nAccess: RDP into domain w/ admin rights\nDetected: not yet, 3 days stable\nBonus: Access to doc mgmt system + Zoom internal creds\nSelling for 0.9 BTC – will include persistence script\nDM to deal",
+        "price": "0.9 BTC"
+    },
+    {
+        "title": "베리타스 헬스 파트너스 액세스",
+        "description": "판매 중: Veritas Health Partners, 캐나다\n매출: 약 $430M\n산업: 의료\n접근 유형: VPN + 작동 중인 RDP\n권한: 로컬 관리자 권한 및 내부 공유 액세스\n탐지되지 않음 – 6일 연속 가동 중\n가격: 0.58 BTC 고정 가격",
+        "price": "0.58 BTC"
+    },
+    {
+        "title": "Portwell Maritime Group Access",
+        "description": "Selling access to Portwell Maritime Group (Singapore)\nAccess: DA creds via exposed RDP svc acct\nRevenue: Est. $2B\nIndustry: Shipping / Transport\nExtras: payroll exports + crew schedules\nContact: DM if you’ve dealt before. Fast buyers only.",
+        "price": "DM for price"
+    },
+    {
+        "title": "Доступ к недвижимости Monarch",
+        "description": "Компания: Monarch Real Estate Investments\nМестонахождение: США, Нью-Йорк\nВыручка: 380 млн долларов\nДоступ: Citrix > внутренний RDP > DA\nНабор постоянных файлов, нетронутый более 4 дней\nДоступны резервные копии документов + договоры аренды клиентов\nЦена: 0,7 BTC, только для серьезных людей",
+        "price": "0.7 BTC"
+    }
+]
+service_templates = {
+    "title": {
+        "Buy": [
+            "Need {service} Expert",
+            "Seeking {service}",
+            "Looking for {service} Pro",
+            "Requesting {service}"
+        ],
+        "Sell": [
+            "Offering {service}",
+            "{service} Available",
+            "Professional {service}",
+            "{service} for Hire"
+        ]
+    },
+    "description": {
+        "Buy": [
+            "Need {service} for a project, {status}. PM with rates.",
+            "Looking for reliable {service}, high budget. DM me.",
+            "Seeking {service} expert, escrow available.",
+            "Want {service}, urgent. Contact me!"
+        ],
+        "Sell": [
+            "Providing {service}, {status}. PM for pricing.",
+            "{service} with fast delivery, contact me.",
+            "Professional {service}, {status}. Escrow accepted.",
+            "Custom {service}, DM for details."
+        ]
+    }
+}
+service_replacements = {
+    "service": ["DDoS attacks", "phishing campaigns", "malware development", "SQL injection", "botnet rental"],
+    "status": ["fast and reliable", "guaranteed results", "24/7 support", "custom solutions"]
+}
+comment_templates = [
+    "Interested in {item}, PM sent!",
+    "Is {item} still available?",
+    "Can you verify {item} quality?",
+    "DM me for {item} details."
+]
+comment_replacements = {
+    "item": ["this deal", "your service", "the credentials", "this data"]
+}
+
+
+def shoutbox_rows(rng, anchor, count, user_ids):
+    for _ in range(count):
+        yield {
+            'user_id': rng.choice(user_ids),
+            'message': generate_text(rng.choice(shoutbox_templates), shoutbox_replacements, rng)[:50],
+            'timestamp': random_timestamp(rng, anchor)
+        }
+
+
+def announcement_rows(rng, anchor, category, count, user_ids):
+    for _ in range(count):
+        yield {
+            'post_type': 'announcements',
+            'category': category,
+            'title': generate_text(rng.choice(announcement_templates["title"]), announcement_replacements, rng)[:100],
+            'body': generate_text(rng.choice(announcement_templates["content"]), announcement_replacements, rng)[:200],
+            'user_id': rng.choice(user_ids),
+            'date': random_timestamp(rng, anchor)
+        }
+
+
+def marketplace_rows(rng, anchor, category, count, user_ids, iab_posts=0):
+    generated = count
+    if category == 'Sellers' and iab_posts:
+        # The predefined posts plus iab_posts random IAB posts, like the default dataset
+        predefined = predefined_iab_posts[:count]
+        for post in predefined:
+            yield {
+                'post_type': 'marketplace',
+                'category': category,
+                'title': post["title"][:100],
+                'body': post["description"][:200],
+                'user_id': rng.choice(user_ids),
+                'price': post["price"],
+                'date': random_timestamp(rng, anchor)
+            }
+        iab_posts = min(iab_posts, count - len(predefined))
+        for _ in range(iab_posts):
+            yield {
+                'post_type': 'marketplace',
+                'category': category,
+                'title': generate_text(rng.choice(iab_marketplace_templates["title"]), iab_replacements, rng)[:100],
+                'body': generate_text(rng.choice(iab_marketplace_templates["description"]), iab_replacements, rng)[:200],
+                'user_id': rng.choice(user_ids),
+                'price': f"${rng.randint(50, 1000)}",
+                'date': random_timestamp(rng, anchor)
+            }
+        generated = count - len(predefined) - iab_posts
+    for _ in range(generated):
+        yield {
+            'post_type': 'marketplace',
+            'category': category,
+            'title': generate_text(rng.choice(marketplace_templates["title"][category]), marketplace_replacements, rng)[:100],
+            'body': generate_text(rng.choice(marketplace_templates["description"][category]), marketplace_replacements, rng)[:200],
+            'user_id': rng.choice(user_ids),
+            'price': f"${rng.randint(50, 1000)}" if category == 'Sellers' else f"Offer ${rng.randint(50, 500)}",
+            'date': random_timestamp(rng, anchor)
+        }
+
+
+def service_rows(rng, anchor, category, count, user_ids):
+    for _ in range(count):
+        yield {
+            'post_type': 'services',
+            'category': category,
+            'title': generate_text(rng.choice(service_templates["title"][category]), service_replacements, rng)[:100],
+            'body': generate_text(rng.choice(service_templates["description"][category]), service_replacements, rng)[:200],
+            'user_id': rng.choice(user_ids),
+            'price': f"${rng.randint(100, 2000)}" if category == 'Sell' else 'Negotiable',
+            'date': random_timestamp(rng, anchor)
+        }
+
+
+def comment_rows(rng, anchor, post_ids, per_post, user_ids):
+    for post_id in post_ids:
+        for _ in range(per_post):
+            yield {
+                'post_id': post_id,
+                'user_id': rng.choice(user_ids),
+                'content': generate_text(rng.choice(comment_templates), comment_replacements, rng)[:100],
+                'date': random_timestamp(rng, anchor)
+            }
@@ -5,37 +5,29 @@ set -e  # Exit on error
 
 echo "Starting entrypoint script..."
 
-# Create database by running app.py briefly
-echo "Creating database..."
-python app.py &
-APP_PID=$!
-sleep 5  # Give app.py time to create database
-kill $APP_PID 2>/dev/null || true  # Stop app.py
-
-# Wait for database file to exist
-echo "Waiting for database to be ready..."
-for i in {1..30}; do
-    if [ -f instance/database.db ]; then
-        echo "Database found!"
-        break
+# With DATABASE_URL pointing at a shared server, a separate one-off container usually prepares
+# the database and SKIP_DB_SETUP=1 keeps every app container from repeating it
+if [ "${SKIP_DB_SETUP:-0}" != "1" ]; then
+    # Create the database, or upgrade an existing one in place
+    echo "Creating database..."
+    flask --app app upgrade-db
+
+    if [ -z "$DATABASE_URL" ] && [ ! -f instance/database.db ]; then
+        echo "Error: Database not created"
+        exit 1
     fi
-    sleep 1
-done
 
-if [ ! -f instance/database.db ]; then
-    echo "Error: Database not created after 30 seconds"
-    exit 1
+    # Populate database
+    echo "Populating database..."
+    python populate_db.py $POPULATE_ARGS
 fi
 
-# Populate database
-echo "Populating database..."
-python populate_db.py
-
-# Start simulators in background
-echo "Starting simulators..."
-python sellers_simulator.py &
-python shoutbox_simulator.py &
+# Start simulators in background, all from one event loop
+if [ "${RUN_SIMULATORS:-1}" = "1" ]; then
+    echo "Starting simulators..."
+    python simulator.py &
+fi
 
-# Start gunicorn on port 5000
+# Start gunicorn on port 5000; workers, threads and recycling come from gunicorn.conf.py
 echo "Starting gunicorn..."
-exec gunicorn --bind 0.0.0.0:5000 app:app
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py app:app
@@ -0,0 +1,69 @@
+# gunicorn.conf.py
+import multiprocessing
+import os
+
+# Server settings for entrypoint.sh (gunicorn -c gunicorn.conf.py app:app). Most settings can be
+# overridden with the environment variable next to it. GUNICORN_PROFILE picks the worker model:
+#   gthread - GUNICORN_THREADS threads per worker. bcrypt hashing and CAPTCHA rendering release
+#             the GIL, so a slow login does not hold up reads; each shoutbox stream holds a thread.
+#   gevent  - one greenlet per connection, up to GUNICORN_CONNECTIONS per worker, for many open
+#             shoutbox streams and exports. gevent and psycogreen come from requirements.txt.
+#   sync    - gunicorn's own default of one request at a time per worker, kept for comparison;
+#             a shoutbox stream ties up a whole worker for as long as it is open.
+PROFILES = {
+    'gthread': {'workers_per_cpu': 1, 'spare_workers': 0, 'threads': 32},
+    'gevent': {'workers_per_cpu': 1, 'spare_workers': 0, 'threads': 1},
+    # gunicorn turns sync workers into gthread ones when threads is above 1
+    'sync': {'workers_per_cpu': 2, 'spare_workers': 1, 'threads': 1},
+}
+DEFAULT_PROFILE = 'gthread'
+
+profile = os.environ.get('GUNICORN_PROFILE', DEFAULT_PROFILE)
+if profile not in PROFILES:
+    raise ValueError(f"Unknown GUNICORN_PROFILE '{profile}', expected one of {', '.join(PROFILES)}")
+
+
+def cpu_count():
+    """CPUs this process may run on, which respects a container's cpuset."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = profile
+workers = int(os.environ.get('GUNICORN_WORKERS',
+                             cpu_count() * PROFILES[profile]['workers_per_cpu'] + PROFILES[profile]['spare_workers']))
+threads = int(os.environ.get('GUNICORN_THREADS', PROFILES[profile]['threads']))
+worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Import the app once in the master so workers share its code pages instead of each loading it.
+# Nothing of ours starts a thread at import: the CAPTCHA pool, shoutbox hub and password pool
+# each start theirs on first use in a worker, keyed by pid. gevent workers load the app
+# themselves, after they patch the standard library, so it never holds unpatched locks.
+preload_app = profile != 'gevent'
+
+# Restart each worker after this many requests, give or take the jitter so they do not all
+# restart at once, to bound slow growth in per-worker memory. 0 disables it.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# The heartbeat file is touched every second; keep it off the container's overlay filesystem
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def post_fork(server, worker):
+    if profile == 'gevent':
+        # Let PostgreSQL queries wait on the event loop instead of blocking the worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        return
+    # Pooled connections opened by the master must not be shared with the workers
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,162 @@
+# instrumentation.py
+import threading
+import time
+from collections import defaultdict
+from flask import g, has_app_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Histogram bucket upper bounds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)  # statements per request
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class Instrumentation:
+    """Per-request SQL statement counts and timings, per endpoint, for this process.
+
+    Every statement the engine executes during a request is counted and timed, as is the time
+    spent encoding JSON and rendering templates. Each response gets a Server-Timing header with
+    the request's own numbers, and render() returns the totals in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)  # (endpoint, method, status) -> count
+        self._durations = {}               # endpoint -> Histogram of total seconds
+        self._queries = {}                 # endpoint -> Histogram of statements per request
+        self._db_seconds = defaultdict(float)
+        self._serialize_seconds = defaultdict(float)
+        self._stats = {}
+        self.enabled = False
+
+    def init_app(self, app, engine):
+        """Hook into the app's requests, JSON provider and templates and into the engine."""
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        # jsonify() goes through app.json.response(), which calls dumps() on the instance
+        dumps = app.json.dumps
+
+        def timed_dumps(obj, **kwargs):
+            started = time.perf_counter()
+            try:
+                return dumps(obj, **kwargs)
+            finally:
+                self._add_serialize(time.perf_counter() - started)
+        app.json.dumps = timed_dumps
+        self.enabled = True
+
+    def add_stats(self, name, stats):
+        """Export the numeric values of stats() as forum_<name>_<key> gauges."""
+        self._stats[name] = stats
+
+    @staticmethod
+    def _current():
+        return g.get('request_metrics') if has_app_context() else None
+
+    def _start(self):
+        g.request_metrics = {'started': time.perf_counter(), 'queries': 0, 'db': 0.0, 'serialize': 0.0}
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._instrumentation_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        metrics = self._current()
+        if metrics is not None:
+            metrics['queries'] += 1
+            metrics['db'] += time.perf_counter() - context._instrumentation_started
+
+    def _add_serialize(self, seconds):
+        metrics = self._current()
+        if metrics is not None:
+            metrics['serialize'] += seconds
+
+    def _before_render(self, sender, template, context, **extra):
+        metrics = self._current()
+        if metrics is not None:
+            metrics['render_started'] = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        metrics = self._current()
+        if metrics is not None and 'render_started' in metrics:
+            self._add_serialize(time.perf_counter() - metrics.pop('render_started'))
+
+    def _finish(self, response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics['started']
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            self._requests[(endpoint, request.method, response.status_code)] += 1
+            self._durations.setdefault(endpoint, Histogram(DURATION_BUCKETS)).observe(total)
+            self._queries.setdefault(endpoint, Histogram(QUERY_BUCKETS)).observe(metrics['queries'])
+            self._db_seconds[endpoint] += metrics['db']
+            self._serialize_seconds[endpoint] += metrics['serialize']
+        # Streamed bodies are produced after this point, so their time is not included
+        response.headers['Server-Timing'] = (
+            f'db;dur={metrics["db"] * 1000:.2f};desc="{metrics["queries"]} queries", '
+            f'serialize;dur={metrics["serialize"] * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+    def render(self):
+        """Return this process's metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, description):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, histograms):
+            for endpoint, hist in sorted(histograms.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+                lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le="+Inf")} {hist.count}')
+                lines.append(f'{name}_sum{_labels(endpoint=endpoint)} {hist.sum}')
+                lines.append(f'{name}_count{_labels(endpoint=endpoint)} {hist.count}')
+
+        with self._lock:
+            header('forum_requests_total', 'counter', 'Requests handled by this process.')
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'forum_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+            header('forum_request_duration_seconds', 'histogram', 'Time from the start of the request to the response, excluding streamed bodies.')
+            histogram('forum_request_duration_seconds', self._durations)
+            header('forum_request_queries', 'histogram', 'SQL statements executed per request.')
+            histogram('forum_request_queries', self._queries)
+            header('forum_db_duration_seconds_total', 'counter', 'Time spent executing SQL statements.')
+            for endpoint, seconds in sorted(self._db_seconds.items()):
+                lines.append(f'forum_db_duration_seconds_total{_labels(endpoint=endpoint)} {seconds}')
+            header('forum_serialize_duration_seconds_total', 'counter', 'Time spent encoding JSON and rendering templates.')
+            for endpoint, seconds in sorted(self._serialize_seconds.items()):
+                lines.append(f'forum_serialize_duration_seconds_total{_labels(endpoint=endpoint)} {seconds}')
+
+        for name, stats in sorted(self._stats.items()):
+            for key, value in sorted(stats().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    header(f'forum_{name}_{key}', 'gauge', f'{key} from the {name} stats.')
+                    lines.append(f'forum_{name}_{key} {value}')
+        return '\n'.join(lines) + '\n'
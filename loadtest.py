@@ -0,0 +1,219 @@
+# loadtest.py
+import argparse
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datagen import USERS
+
+# Relative request rates, modelled on what static/js/main.js does for an open page: the
+# shoutbox is polled every 5 seconds and the category counts every 60, on top of page views
+# that load the listings, a category page, a post detail or a search.
+DEFAULT_MIX = {
+    'shoutbox': 12,
+    'category_counts': 1,
+    'announcements': 2,
+    'marketplace': 2,
+    'services': 2,
+    'category': 4,
+    'category_keyset': 1,
+    'post': 3,
+    'search': 1,
+    'home': 1,
+}
+CATEGORIES = {
+    'announcements': ['Announcements', 'General', 'MM Service'],
+    'marketplace': ['Buyers', 'Sellers'],
+    'services': ['Buy', 'Sell'],
+}
+SEARCH_TERMS = ['RDP', 'phishing', 'escrow', 'malware', 'VPN', 'credentials', 'botnet', 'data leaks']
+
+
+class Client:
+    """One logged-in forum user with its own cookie jar."""
+
+    def __init__(self, base_url, secret, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.secret = secret
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, path, data=None):
+        """Send a request and return (status, body); HTTP errors are returned, not raised."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers={'X-Loadtest-Secret': self.secret})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, username, password):
+        self.request('/login')
+        status, body = self.request('/api/test/captcha')
+        if status != 200:
+            raise RuntimeError("CAPTCHA test hook is disabled; start the app with LOADTEST_SECRET set to --secret")
+        captcha = json.loads(body)['captcha']
+        status, body = self.request('/login', {'username': username, 'password': password, 'captcha': captcha})
+        if b'Invalid' in body:
+            raise RuntimeError(f"Login failed for {username}")
+
+
+class Traffic:
+    """Builds request paths for each route in the mix from ids discovered on the live instance."""
+
+    def __init__(self, client, rng):
+        self.rng = rng
+        self.post_ids = {}
+        for post_type in CATEGORIES:
+            status, body = client.request(f'/api/{post_type}')
+            self.post_ids[post_type] = [post['id'] for post in json.loads(body)] if status == 200 else []
+
+    def path(self, route):
+        rng = self.rng
+        post_type = rng.choice(list(CATEGORIES))
+        category = urllib.parse.quote(rng.choice(CATEGORIES[post_type]))
+        if route == 'shoutbox':
+            return '/api/shoutbox'
+        if route == 'category_counts':
+            return '/api/category_counts'
+        if route in ('announcements', 'marketplace', 'services'):
+            return f'/api/{route}'
+        if route == 'category':
+            return f'/api/posts/{post_type}/{category}?page={rng.randint(1, 5)}'
+        if route == 'category_keyset':
+            return f'/api/posts/{post_type}/{category}?after='
+        if route == 'post':
+            post_type = rng.choice([name for name, ids in self.post_ids.items() if ids] or ['marketplace'])
+            return f'/api/post/{post_type}/{rng.choice(self.post_ids.get(post_type) or [1])}'
+        if route == 'search':
+            return f'/api/search?query={urllib.parse.quote(rng.choice(SEARCH_TERMS))}&type='
+        if route == 'home':
+            return '/'
+        raise ValueError(f"Unknown route '{route}'")
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, latency, ok):
+        with self._lock:
+            self.latencies[route].append(latency)
+            if not ok:
+                self.errors[route] += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(recorder, duration):
+    """Return one row per route (and a total) with throughput, error rate and latency percentiles."""
+    rows = []
+    routes = sorted(recorder.latencies) + ['TOTAL']
+    for route in routes:
+        if route == 'TOTAL':
+            latencies = sorted(l for values in recorder.latencies.values() for l in values)
+            errors = sum(recorder.errors.values())
+        else:
+            latencies = sorted(recorder.latencies[route])
+            errors = recorder.errors[route]
+        rows.append({
+            'route': route,
+            'requests': len(latencies),
+            'rps': len(latencies) / duration,
+            'error_rate': errors / len(latencies) if latencies else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        })
+    return rows
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        route, _, weight = part.partition('=')
+        if route not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown route '{route}', expected one of {', '.join(DEFAULT_MIX)}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    clients = []
+    for n in range(args.users):
+        username, password, _ = USERS[n % len(USERS)]
+        client = Client(args.url, args.secret, args.timeout)
+        client.login(username, password)
+        clients.append(client)
+    traffic = Traffic(clients[0], rng)
+    routes, weights = zip(*args.mix.items())
+    recorder = Recorder()
+
+    def fire(client, route, path, scheduled):
+        try:
+            status, _ = client.request(path)
+            ok = status < 400
+        except Exception:
+            ok = False
+        # Measured from the scheduled start, so time spent queued behind a slow server counts
+        recorder.record(route, time.monotonic() - scheduled, ok)
+
+    # Open loop: requests are started on a fixed schedule whether or not earlier ones finished
+    interval = 1.0 / args.rps
+    started = time.monotonic()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        n = 0
+        while True:
+            scheduled = started + n * interval
+            if scheduled - started >= args.duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            route = rng.choices(routes, weights)[0]
+            pool.submit(fire, rng.choice(clients), route, traffic.path(route), scheduled)
+            n += 1
+    return summarize(recorder, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay forum traffic against a running instance and report latency per route.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Base URL of the forum")
+    parser.add_argument('--secret', required=True, help="LOADTEST_SECRET the app was started with")
+    parser.add_argument('--rps', type=float, default=20.0, help="Target requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run")
+    parser.add_argument('--users', type=int, default=5, help="Logged-in sessions to spread requests over")
+    parser.add_argument('--concurrency', type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="Route weights, e.g. shoutbox=12,category=4,search=1 (default: main.js-like mix)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, help="Seed for a reproducible request sequence")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    rows = run(args)
+    print(f"{'route':<16} {'requests':>8} {'rps':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(f"{row['route']:<16} {row['requests']:>8} {row['rps']:>7.1f} {row['error_rate']:>7.1%} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rps': args.rps, 'duration': args.duration, 'routes': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
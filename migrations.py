@@ -0,0 +1,204 @@
+# migrations.py
+import logging
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, inspect, text
+from sqlalchemy.schema import CreateTable
+from models import db, User, SchemaVersion, Shoutbox, Post, Comment
+import search_index
+import counters
+import user_summary
+import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+# The separate post tables and the comment table as they were before migration 5 merged the
+# posts into one table. Earlier migrations work on these definitions, not on models.py.
+LEGACY = MetaData()
+User.__table__.to_metadata(LEGACY)
+LEGACY_POST_TABLES = {
+    # post_type -> (table, body column, post_type stored on its comments)
+    'announcements': (Table(
+        'announcement', LEGACY, Column('id', Integer, primary_key=True), Column('category', String(20)),
+        Column('title', String(100)), Column('content', Text),
+        Column('user_id', Integer, ForeignKey('user.id'), nullable=False), Column('date', DateTime)
+    ), 'content', 'announcement'),
+    'marketplace': (Table(
+        'marketplace', LEGACY, Column('id', Integer, primary_key=True), Column('category', String(20)),
+        Column('title', String(100)), Column('description', Text),
+        Column('user_id', Integer, ForeignKey('user.id'), nullable=False), Column('price', String(20)),
+        Column('date', DateTime)
+    ), 'description', 'marketplace'),
+    'services': (Table(
+        'service', LEGACY, Column('id', Integer, primary_key=True), Column('category', String(20)),
+        Column('title', String(100)), Column('description', Text),
+        Column('user_id', Integer, ForeignKey('user.id'), nullable=False), Column('price', String(20)),
+        Column('date', DateTime)
+    ), 'description', 'service'),
+}
+LEGACY_COMMENT = Table(
+    'comment', LEGACY, Column('id', Integer, primary_key=True), Column('post_type', String(20)),
+    Column('post_id', Integer), Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('content', Text), Column('date', DateTime)
+)
+
+
+def _create_missing_indexes(connection):
+    """Create every index declared in models.py that the database does not have yet."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def _rebuild_table(connection, table, expressions=None):
+    """Recreate a table from its new definition, copying rows across.
+
+    SQLite cannot change a column type in place, so the table is copied into a new one and
+    swapped in. expressions maps a column name to the SQL used to convert the old value.
+    Indexes are dropped with the old table and recreated; triggers are not.
+    """
+    expressions = expressions or {}
+    scratch = MetaData()
+    for foreign_key in table.foreign_keys:
+        foreign_key.column.table.to_metadata(scratch)
+    staging = table.to_metadata(scratch, name=f'_{table.name}_new')
+    connection.execute(CreateTable(staging))
+    columns = ', '.join(column.name for column in table.columns)
+    values = ', '.join(expressions.get(column.name, column.name) for column in table.columns)
+    connection.execute(text(f'INSERT INTO {staging.name} ({columns}) SELECT {values} FROM {table.name}'))
+    connection.execute(text(f'DROP TABLE {table.name}'))
+    connection.execute(text(f'ALTER TABLE {staging.name} RENAME TO {table.name}'))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _convert_dates_to_datetime(connection):
+    """Turn the String(20) date/timestamp columns into DateTime columns.
+
+    Old rows hold 'YYYY-MM-DD HH:MM:SS'; they are rewritten in the storage format SQLAlchemy
+    uses for DateTime on SQLite so old and new rows compare and sort consistently.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    tables = [(Shoutbox.__table__, 'timestamp'), (LEGACY_COMMENT, 'date')]
+    tables += [(table, 'date') for table, _, _ in LEGACY_POST_TABLES.values()]
+    for table, column in tables:
+        convert = f"CASE WHEN length({column}) = 19 THEN {column} || '.000000' ELSE {column} END"
+        _rebuild_table(connection, table, {column: convert})
+
+
+def _seed_category_counts(connection):
+    """Fill the category_count table created by create_all from the existing posts."""
+    counters.rebuild(connection)
+
+
+def _seed_user_summaries(connection):
+    """Fill the user_summary table created by create_all from the existing posts and comments."""
+    user_summary.rebuild(connection)
+
+
+def _reset_sequence(connection, table_name):
+    # Rows were copied with explicit ids, which PostgreSQL's serial sequence does not see
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table_name}"
+        ))
+
+
+def _merge_post_tables(connection):
+    """Move announcements, marketplace posts and services into the post table.
+
+    Announcements keep their ids; marketplace posts and services are shifted past the ids
+    before them, and their comments follow with post_type replaced by a foreign key to the
+    post. Comments whose post no longer exists are dropped. The old tables are removed and
+    the search index, counters and user summaries are rebuilt from the merged table.
+    """
+    if not inspect(connection).has_table('announcement'):
+        return
+    search_index.drop_triggers(connection)
+    search_index.drop(connection)
+    post = Post.__table__
+    offset = 0
+    shifts = []
+    for post_type, (table, body, comment_type) in LEGACY_POST_TABLES.items():
+        price = 'price' if 'price' in table.c else 'NULL'
+        connection.execute(text(
+            f'INSERT INTO {post.name} (id, post_type, category, title, body, price, user_id, date) '
+            f"SELECT id + {offset}, '{post_type}', category, title, {body}, {price}, user_id, date FROM {table.name}"
+        ))
+        shifts.append(f"WHEN '{comment_type}' THEN {offset}")
+        offset += connection.execute(text(f'SELECT coalesce(max(id), 0) FROM {table.name}')).scalar()
+        # Its search triggers go with it, before the comment rebuild below can fire them
+        connection.execute(text(f'DROP TABLE {table.name}'))
+    comment = LEGACY_COMMENT.name
+    new_post_id = f"{comment}.post_id + CASE {comment}.post_type {' '.join(shifts)} ELSE NULL END"
+    orphans = connection.execute(text(
+        f'DELETE FROM {comment} WHERE NOT EXISTS '
+        f'(SELECT 1 FROM {post.name} WHERE {post.name}.id = {new_post_id})'
+    )).rowcount
+    if orphans:
+        logger.warning(f"Dropped {orphans} comment(s) on posts that no longer exist")
+    _rebuild_table(connection, Comment.__table__, {'post_id': new_post_id})
+    _reset_sequence(connection, post.name)
+    _reset_sequence(connection, Comment.__tablename__)
+    search_index.create(connection)
+    counters.rebuild(connection)
+    user_summary.rebuild(connection)
+    response_cache.bump_all(connection)
+
+
+# Ordered (version, description, function) steps. Append new steps at the end, never renumber.
+MIGRATIONS = [
+    (1, 'Add category/date, comment lookup, timestamp and foreign key indexes', _create_missing_indexes),
+    (2, 'Store post, comment and shoutbox dates as DateTime', _convert_dates_to_datetime),
+    (3, 'Seed the per-category post counters', _seed_category_counts),
+    (4, 'Seed the per-user activity summaries', _seed_user_summaries),
+    (5, 'Merge the announcement, marketplace and service tables into post', _merge_post_tables),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def drop_legacy_tables(connection):
+    """Drop the pre-merge post tables if they exist, e.g. before populate_db.py recreates the schema."""
+    for table, _, _ in LEGACY_POST_TABLES.values():
+        table.drop(connection, checkfirst=True)
+
+
+def current_version(connection):
+    """Return the schema version recorded in the database (0 for databases that predate migrations)."""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(text(f'SELECT max(version) FROM {SchemaVersion.__tablename__}')).scalar() or 0
+
+
+def _stamp(connection, version):
+    connection.execute(SchemaVersion.__table__.delete())
+    connection.execute(SchemaVersion.__table__.insert().values(version=version))
+
+
+def upgrade():
+    """Bring the database up to the latest schema in place and return the versions applied.
+
+    Must be called inside an app context. A database without any tables is created from
+    models.py and stamped as current; an existing one keeps its data and only runs the
+    migrations it has not seen yet.
+    """
+    with db.engine.connect() as connection:
+        fresh = not inspect(connection).has_table(User.__tablename__)
+        version = current_version(connection)
+    db.create_all()
+    if fresh:
+        with db.engine.begin() as connection:
+            _stamp(connection, LATEST_VERSION)
+        logger.info(f"Created schema at version {LATEST_VERSION}")
+        return []
+
+    applied = []
+    for step, description, migrate in MIGRATIONS:
+        if step <= version:
+            continue
+        with db.engine.begin() as connection:
+            logger.info(f"Applying migration {step}: {description}")
+            migrate(connection)
+            _stamp(connection, step)
+        applied.append(step)
+    return applied
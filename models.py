@@ -9,49 +9,72 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(50), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
     avatar = db.Column(db.String(200), nullable=True)  # Path to avatar image
-    announcements = db.relationship('Announcement', backref='author', lazy=True)
-    marketplace_posts = db.relationship('Marketplace', backref='author', lazy=True)
-    services = db.relationship('Service', backref='author', lazy=True)
+    posts = db.relationship('Post', backref='author', lazy=True)
     comments = db.relationship('Comment', backref='author', lazy=True)
     shoutbox_messages = db.relationship('Shoutbox', backref='author', lazy=True)  # Changed backref to 'author'
 
 class Shoutbox(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     message = db.Column(db.Text)
-    timestamp = db.Column(db.String(20))
+    timestamp = db.Column(db.DateTime, index=True)
     user = db.relationship('User', backref='shoutbox', lazy=True)  # Changed backref to 'shoutbox'
 
-class Announcement(db.Model):
+class Post(db.Model):
+    """Announcements, marketplace posts and services in one table, told apart by post_type."""
+    __table_args__ = (
+        db.Index('ix_post_post_type_category_date', 'post_type', 'category', 'date'),
+        db.Index('ix_post_post_type_date', 'post_type', 'date'),
+        db.Index('ix_post_post_type_id', 'post_type', 'id'),
+        db.Index('ix_post_user_id_date', 'user_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    category = db.Column(db.String(20))  # Announcements, General, MM Service
+    post_type = db.Column(db.String(20), nullable=False)  # announcements, marketplace, services
+    category = db.Column(db.String(20))
     title = db.Column(db.String(100))
-    content = db.Column(db.Text)
+    body = db.Column(db.Text)  # content of an announcement, description of a marketplace post or service
+    price = db.Column(db.String(20))  # marketplace posts and services only
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    date = db.Column(db.String(20))
+    date = db.Column(db.DateTime, index=True)
+    comments = db.relationship('Comment', backref='post', lazy=True)
+    __mapper_args__ = {'polymorphic_on': post_type}
 
-class Marketplace(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    category = db.Column(db.String(20))  # Buyers, Sellers
-    title = db.Column(db.String(100))
-    description = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    price = db.Column(db.String(20))
-    date = db.Column(db.String(20))
+class Announcement(Post):
+    __mapper_args__ = {'polymorphic_identity': 'announcements'}  # Announcements, General, MM Service
+    content = db.synonym('body')
 
-class Service(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    category = db.Column(db.String(20))  # Buy, Sell
-    title = db.Column(db.String(100))
-    description = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    price = db.Column(db.String(20))
-    date = db.Column(db.String(20))
+class Marketplace(Post):
+    __mapper_args__ = {'polymorphic_identity': 'marketplace'}  # Buyers, Sellers
+    description = db.synonym('body')
+
+class Service(Post):
+    __mapper_args__ = {'polymorphic_identity': 'services'}  # Buy, Sell
+    description = db.synonym('body')
 
 class Comment(db.Model):
+    __table_args__ = (
+        db.Index('ix_comment_post_id_date', 'post_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    post_type = db.Column(db.String(20))  # announcement, marketplace, service
-    post_id = db.Column(db.Integer)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     content = db.Column(db.Text)
-    date = db.Column(db.String(20))
\ No newline at end of file
+    date = db.Column(db.DateTime)
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)  # Highest migration applied, see migrations.py
+
+class CategoryCount(db.Model):
+    post_type = db.Column(db.String(20), primary_key=True)  # announcements, marketplace, services
+    category = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)  # Maintained by counters.py
+
+class CacheGeneration(db.Model):
+    table_name = db.Column(db.String(20), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)  # Bumped on every write, see response_cache.py
+
+class UserSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)  # Maintained by user_summary.py
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+    last_active = db.Column(db.DateTime)  # Date of the newest post or comment
@@ -0,0 +1,74 @@
+# password_service.py
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from per_process import PerProcess
+
+logger = logging.getLogger(__name__)
+
+
+def _executor_class():
+    # Under gevent's monkey patching, threads are greenlets and bcrypt would run on the event
+    # loop, blocking every other connection of the worker; gevent's own pool uses real threads
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor
+    return ThreadPoolExecutor
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when the password pool already has as many requests as it will queue."""
+
+
+class PasswordService:
+    """Runs bcrypt hashing and verification on a small dedicated thread pool.
+
+    bcrypt releases the GIL while it works, so a few threads hash in parallel without holding
+    up the request threads serving reads; capping the pool caps the CPU that a burst of logins
+    can take. At most workers + queue_size calls are accepted at once and any further call
+    fails fast with PasswordServiceBusy instead of piling up behind the others; a call that
+    waits longer than timeout seconds for its result raises it too.
+    """
+
+    def __init__(self, bcrypt, workers=4, queue_size=16, timeout=30):
+        self.bcrypt = bcrypt
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = PerProcess(self._start_executor)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logger.warning("Password service is saturated, rejecting request")
+            raise PasswordServiceBusy()
+        try:
+            future = self._executor.get().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            # The call keeps its slot until it finishes; only this request stops waiting for it
+            logger.warning(f"Password service did not answer within {self.timeout}s, rejecting request")
+            raise PasswordServiceBusy()
+
+    def _start_executor(self):
+        # Each gunicorn worker hashes on its own pool
+        return _executor_class()(self.workers, thread_name_prefix='bcrypt')
+
+    def hash(self, password):
+        """Return the bcrypt hash of password as a str."""
+        return self._submit(self.bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        """Return True if password matches password_hash."""
+        return self._submit(self.bcrypt.check_password_hash, password_hash, password)
@@ -0,0 +1,25 @@
+# per_process.py
+import os
+import threading
+
+
+class PerProcess:
+    """Holds a value built once per process, such as a started background thread or a pool.
+
+    Threads do not survive a fork, so a gunicorn worker cannot use the ones its master started;
+    get() builds the value again the first time it is called in each new process.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._value = None
+
+    def get(self):
+        """Return this process's value, calling factory() first if it has none yet."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._value = self.factory()
+                self._pid = os.getpid()
+            return self._value
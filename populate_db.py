@@ -2,10 +2,28 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from models import db, User, Shoutbox, Announcement, Marketplace, Service, Comment
-from datetime import datetime, timedelta
-import random
+import database
+from models import db, User, Shoutbox, Post, Announcement, Marketplace, Service, Comment
+import search_index  # registers the full-text index DDL with create_all/drop_all
+import migrations
+import counters  # keeps the category counters in step with inserted posts
+import user_summary  # keeps the per-user post and comment counts in step
+import response_cache  # invalidates cached API responses for inserted rows
+from datetime import datetime
+from datagen import (
+    USERS, make_rng, split_count, default_anchor, generate_text, random_timestamp,
+    shoutbox_templates, shoutbox_replacements, announcement_templates, announcement_replacements,
+    marketplace_templates, marketplace_replacements, iab_marketplace_templates, iab_replacements,
+    predefined_iab_posts, service_templates, service_replacements, comment_templates, comment_replacements,
+    shoutbox_rows, announcement_rows, marketplace_rows, service_rows, comment_rows
+)
 import logging
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, inspect
 
 # Configuration variables
 NUM_SHOUTBOX_MESSAGES = 20
@@ -25,44 +43,24 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))  # same cost factor as app.py
+database.init_app(app, db)
 bcrypt = Bcrypt(app)
 
-def generate_text(template, replacements):
-    """Generate text by replacing placeholders in template with random choices from replacements."""
-    try:
-        text = template
-        for key, values in replacements.items():
-            text = text.replace(f"{{{key}}}", random.choice(values))
-        return text.strip()
-    except Exception as e:
-        logger.error(f"Error generating text for template '{template}': {str(e)}")
-        return "Generated text error"
-
-def init_db():
+def init_db(seed=None, anchor=None):
+    rng = make_rng(seed)
+    anchor = anchor or default_anchor(seed is not None)
     with app.app_context():
         logger.info("Starting database initialization")
+        with db.engine.begin() as connection:
+            migrations.drop_legacy_tables(connection)
         db.drop_all()
         logger.info("Dropped existing tables")
-        db.create_all()
+        migrations.upgrade()
         logger.info("Created new tables")
 
         # Create 10 user profiles
-        users = [
-            ('DarkHacker', 'pass123', 'darkhacker.jpg'),
-            ('CyberGhost', 'ghost456', 'cyberghost.jpg'),
-            ('ShadowV', 'shadow789', 'shadowv.jpg'),
-            ('AnonX', 'anon101', 'anonx.jpg'),
-            ('N3tRunn3r', 'runner202', 'netrunner.jpg'),
-            ('Crypt0King', 'king303', 'cryptoking.jpg'),
-            ('ZeroByte', 'zero404', 'zerobyte.jpg'),
-            ('HackSavvy', 'savvy505', 'hacksavvy.jpg'),
-            ('GhostRider', 'rider606', 'ghostrider.jpg'),
-            ('DataViper', 'viper707', 'dataviper.jpg'),
-        ]
-        for username, password, avatar in users:
+        for username, password, avatar in USERS:
             if not User.query.filter_by(username=username).first():
                 hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
                 user = User(username=username, password=hashed_password, avatar=avatar)
@@ -78,195 +76,16 @@ def init_db():
 
         user_ids = [user.id for user in User.query.all()]
 
-        # Generate timestamps (within last 30 days)
-        def random_timestamp():
-            days_ago = random.randint(0, 30)
-            hours_ago = random.randint(0, 23)
-            minutes_ago = random.randint(0, 59)
-            seconds_ago = random.randint(0, 59)
-            return (datetime.now() - timedelta(days=days_ago, hours=hours_ago, minutes=minutes_ago, seconds=seconds_ago)).strftime('%Y-%m-%d %H:%M:%S')
-
-        # Templates and replacements for text generation
-        shoutbox_templates = [
-            "New {item} drop in {place}!",
-            "Looking for {item}, PM me!",
-            "Anyone got {item} for sale?",
-            "Fresh {item} available, DM for details!"
-        ]
-        shoutbox_replacements = {
-            "item": ["CC dumps", "PayPal accounts", "phishing kits", "DDoS service", "malware"],
-            "place": ["marketplace", "services", "dark pool"]
-        }
-        announcement_templates = {
-            "title": [
-                "{action} {item}",
-                "{item} {status} Update",
-                "New {item} Guidelines",
-                "Discuss {item} Trends"
-            ],
-            "content": [
-                "{action} {item}. Contact me for details.",
-                "Recent {item} trends show {status}. Share your thoughts!",
-                "Offering {service} for secure {item} deals. PM to join.",
-                "Tips: Always verify {item} before trading."
-            ]
-        }
-        announcement_replacements = {
-            "action": ["New rules for", "Tips for trading", "Offering", "Discussing"],
-            "item": ["data breaches", "phishing kits", "escrow services", "cyber-crime tools"],
-            "status": ["increased activity", "new methods", "high demand", "stricter rules"],
-            "service": ["middleman services", "secure deals", "escrow", "verification"]
-        }
-        marketplace_templates = {
-            "title": {
-                "Buyers": [
-                    "Need {item}, High Budget",
-                    "Looking for {item}",
-                    "Buying Fresh {item}",
-                    "Seeking {item} ASAP"
-                ],
-                "Sellers": [
-                    "Selling {item}",
-                    "Fresh {item} Available",
-                    "{item} for Sale, {status}",
-                    "High-Quality {item} Drop"
-                ]
-            },
-            "description": {
-                "Buyers": [
-                    "Looking for {item}, willing to pay {price}. PM with offers.",
-                    "Need clean {item}, urgent. DM me for details.",
-                    "Seeking reliable {item} source, escrow available.",
-                    "Buying {item}, top dollar for quality."
-                ],
-                "Sellers": [
-                    "Selling {item}, high quality, {status}. PM for details.",
-                    "Fresh batch of {item}, ready to use. Contact me!",
-                    "{item} available, {status}. Escrow accepted.",
-                    "High-validity {item}, bulk discounts available."
-                ]
-            }
-        }
-        marketplace_replacements = {
-            "item": ["CC dumps", "PayPal accounts", "gift card codes", "data leaks", "RDP credentials", "VPN logins"],
-            "status": ["clean and verified", "high balance", "freshly obtained", "limited stock"],
-            "price": ["$100-$500", "$50-$200", "negotiable", "top dollar"]
-        }
-        iab_marketplace_templates = {
-            "title": ["Access to {company} Network", "Selling {company} Credentials", "{company} IAB Drop"],
-            "description": ["Compromised {company} access, {status}. PM for secure deal.", "Selling {company} network credentials, clean. Escrow only."]
-        }
-        iab_replacements = {
-            "company": ["Acme Corp", "TechTrend Inc", "GlobalSys Ltd", "DataCore Solutions"],
-            "status": ["verified admin access", "full network control", "recent breach", "exclusive access"]
-        }
-        # Predefined IAB posts for Sellers
-        predefined_iab_posts = [
-            {
-                "title": "TD Bank RDP Access",
-                "description": "Company: TD Bank\nRevenue: $1.64 billion\nIndustry: Banking\nAccess type: RDP\nPrice: DM me for price, serious buyers only, MM accepted",
-                "price": "DM for price"
-            },
-            {
-                "title": "Selling SMB Access to RBC Bank",
-                "description": "Selling SMB access to RBC bank\nRevenue: $5.21\nIndustry: Banking\nCusomters: over 10 million\nCountry: Canada\n\n$12,000 Price is non-negotiatiable, dm me",
-                "price": "$12000"
-            },
-            {
-                "title": "Capital Freight Co. Access",
-                "description": "Selling access to Capital Freight Co. (Texas-based logistics)\nRevenue: ~$900M\nAccess: Full RDP, domain admin via svc_x backup creds\nExtras: Internal invoices, mapped drives, Outlook web creds\nEDR: minimal – Defender only\nPrice: 0.6 BTC firm, BTC only, DM me quick",
-                "price": "0.6 BTC"
-            },
-            {
-                "title": "AspenWell 生物科技有限公司 访问",
-                "description": "公司：AspenWell Biotech Ltd\n地点：荷兰\n收入：$1.3 亿美元\n访问类型：VPN > 内部 RDP > DA\n额外信息：SharePoint 暴露，部署了 RMM 代理\n安全：内部无防病毒软件，未触发日志\n价格：1.05 BTC，支持 escrow 支付（需与卖家协商）\n仅向一名买家出售。",
-                "price": "1.05 BTC"
-            },
-            {
-                "title": "GLOBEX Holdings VPN Access",
-                "description": "got corp vpn + psremote into GLOBEX Holdings, some UK fintech trash\nDA rights, creds pulled from exposed git repo (lol)\nno EDR, just weak-ass AV. internal docs and finance data wide open\nnot waitin long. 0.7 BTC. msg only if u got coin",
-                "price": "0.7 BTC"
-            },
-            {
-                "title": "Arctic Foods Group RDP Access",
-                "description": "ACCESS TO ARCTIC FOODS GROUP\n– Canada HQ’d food distributor\n– RDP w/ DA, access stable 4 days\n– billing, inventory, HR PDFs open\n– Sophos AV but neutered\nRevenue: 2.1B CAD\nPrice: 1.2 BTC\nFAST BUYERS ONLY. No vouches, no timewasters.",
-                "price": "1.2 BTC"
-            },
-            {
-                "title": "Silverline Capital Partners Access",
-                "description": "Company: Silverline Capital Partners (NY Private Equity firm)\nRevenue: approx $500M AUM\nAccess: RDP into domain w/ admin rights\nDetected: not yet, 3 days stable\nBonus: Access to doc mgmt system + Zoom internal creds\nSelling for 0.9 BTC – will include persistence script\nDM to deal",
-                "price": "0.9 BTC"
-            },
-            {
-                "title": "베리타스 헬스 파트너스 액세스",
-                "description": "판매 중: Veritas Health Partners, 캐나다\n매출: 약 $430M\n산업: 의료\n접근 유형: VPN + 작동 중인 RDP\n권한: 로컬 관리자 권한 및 내부 공유 액세스\n탐지되지 않음 – 6일 연속 가동 중\n가격: 0.58 BTC 고정 가격",
-                "price": "0.58 BTC"
-            },
-            {
-                "title": "Portwell Maritime Group Access",
-                "description": "Selling access to Portwell Maritime Group (Singapore)\nAccess: DA creds via exposed RDP svc acct\nRevenue: Est. $2B\nIndustry: Shipping / Transport\nExtras: payroll exports + crew schedules\nContact: DM if you’ve dealt before. Fast buyers only.",
-                "price": "DM for price"
-            },
-            {
-                "title": "Доступ к недвижимости Monarch",
-                "description": "Компания: Monarch Real Estate Investments\nМестонахождение: США, Нью-Йорк\nВыручка: 380 млн долларов\nДоступ: Citrix > внутренний RDP > DA\nНабор постоянных файлов, нетронутый более 4 дней\nДоступны резервные копии документов + договоры аренды клиентов\nЦена: 0,7 BTC, только для серьезных людей",
-                "price": "0.7 BTC"
-            }
-        ]
-        service_templates = {
-            "title": {
-                "Buy": [
-                    "Need {service} Expert",
-                    "Seeking {service}",
-                    "Looking for {service} Pro",
-                    "Requesting {service}"
-                ],
-                "Sell": [
-                    "Offering {service}",
-                    "{service} Available",
-                    "Professional {service}",
-                    "{service} for Hire"
-                ]
-            },
-            "description": {
-                "Buy": [
-                    "Need {service} for a project, {status}. PM with rates.",
-                    "Looking for reliable {service}, high budget. DM me.",
-                    "Seeking {service} expert, escrow available.",
-                    "Want {service}, urgent. Contact me!"
-                ],
-                "Sell": [
-                    "Providing {service}, {status}. PM for pricing.",
-                    "{service} with fast delivery, contact me.",
-                    "Professional {service}, {status}. Escrow accepted.",
-                    "Custom {service}, DM for details."
-                ]
-            }
-        }
-        service_replacements = {
-            "service": ["DDoS attacks", "phishing campaigns", "malware development", "SQL injection", "botnet rental"],
-            "status": ["fast and reliable", "guaranteed results", "24/7 support", "custom solutions"]
-        }
-        comment_templates = [
-            "Interested in {item}, PM sent!",
-            "Is {item} still available?",
-            "Can you verify {item} quality?",
-            "DM me for {item} details."
-        ]
-        comment_replacements = {
-            "item": ["this deal", "your service", "the credentials", "this data"]
-        }
-
         # Populate Shoutbox
         logger.info(f"Populating shoutbox with {NUM_SHOUTBOX_MESSAGES} messages")
         for i in range(0, NUM_SHOUTBOX_MESSAGES, 5):  # Batch of 5
             batch_size = min(5, NUM_SHOUTBOX_MESSAGES - i)
-            messages = [generate_text(random.choice(shoutbox_templates), shoutbox_replacements)[:50] for _ in range(batch_size)]
+            messages = [generate_text(rng.choice(shoutbox_templates), shoutbox_replacements, rng)[:50] for _ in range(batch_size)]
             for j, message in enumerate(messages):
                 shout = Shoutbox(
-                    user_id=random.choice(user_ids),
+                    user_id=rng.choice(user_ids),
                     message=message,
-                    timestamp=random_timestamp()
+                    timestamp=random_timestamp(rng, anchor)
                 )
                 db.session.add(shout)
                 logger.info(f"Added shoutbox message {i + j + 1}/{NUM_SHOUTBOX_MESSAGES}: {message[:30]}...")
@@ -284,15 +103,15 @@ def init_db():
             logger.info(f"Populating {category} announcements with {NUM_POSTS_PER_CATEGORY} posts")
             for i in range(0, NUM_POSTS_PER_CATEGORY, 5):  # Batch of 5
                 batch_size = min(5, NUM_POSTS_PER_CATEGORY - i)
-                titles = [generate_text(random.choice(announcement_templates["title"]), announcement_replacements)[:100] for _ in range(batch_size)]
-                contents = [generate_text(random.choice(announcement_templates["content"]), announcement_replacements)[:200] for _ in range(batch_size)]
+                titles = [generate_text(rng.choice(announcement_templates["title"]), announcement_replacements, rng)[:100] for _ in range(batch_size)]
+                contents = [generate_text(rng.choice(announcement_templates["content"]), announcement_replacements, rng)[:200] for _ in range(batch_size)]
                 for j, (title, content) in enumerate(zip(titles, contents)):
                     ann = Announcement(
                         category=category,
                         title=title,
                         content=content,
-                        user_id=random.choice(user_ids),
-                        date=random_timestamp()
+                        user_id=rng.choice(user_ids),
+                        date=random_timestamp(rng, anchor)
                     )
                     db.session.add(ann)
                     logger.info(f"Added {category} announcement {i + j + 1}/{NUM_POSTS_PER_CATEGORY}: {title[:30]}...")
@@ -317,9 +136,9 @@ def init_db():
                         category=category,
                         title=post["title"][:100],
                         description=post["description"][:200],
-                        user_id=random.choice(user_ids),
+                        user_id=rng.choice(user_ids),
                         price=post["price"],
-                        date=random_timestamp()
+                        date=random_timestamp(rng, anchor)
                     )
                     db.session.add(market)
                     logger.info(f"Added {category} predefined IAB post {i + 1}/{predefined_count}: {post['title'][:30]}...")
@@ -334,16 +153,16 @@ def init_db():
                 # Add random IAB posts
                 iab_posts = min(NUM_IAB_SELLER_POSTS, target_posts - predefined_count)
                 for i in range(iab_posts):
-                    title = generate_text(random.choice(iab_marketplace_templates["title"]), iab_replacements)[:100]
-                    description = generate_text(random.choice(iab_marketplace_templates["description"]), iab_replacements)[:200]
-                    price = f"${random.randint(50, 1000)}"
+                    title = generate_text(rng.choice(iab_marketplace_templates["title"]), iab_replacements, rng)[:100]
+                    description = generate_text(rng.choice(iab_marketplace_templates["description"]), iab_replacements, rng)[:200]
+                    price = f"${rng.randint(50, 1000)}"
                     market = Marketplace(
                         category=category,
                         title=title,
                         description=description,
-                        user_id=random.choice(user_ids),
+                        user_id=rng.choice(user_ids),
                         price=price,
-                        date=random_timestamp()
+                        date=random_timestamp(rng, anchor)
                     )
                     db.session.add(market)
                     logger.info(f"Added {category} random IAB post {i + 1}/{iab_posts}: {title[:30]}...")
@@ -360,17 +179,17 @@ def init_db():
                 logger.info(f"Populating {non_iab_posts} non-IAB posts for {category}")
                 for i in range(0, non_iab_posts, 5):  # Batch of 5
                     batch_size = min(5, non_iab_posts - i)
-                    titles = [generate_text(random.choice(marketplace_templates["title"][category]), marketplace_replacements)[:100] for _ in range(batch_size)]
-                    descriptions = [generate_text(random.choice(marketplace_templates["description"][category]), marketplace_replacements)[:200] for _ in range(batch_size)]
+                    titles = [generate_text(rng.choice(marketplace_templates["title"][category]), marketplace_replacements, rng)[:100] for _ in range(batch_size)]
+                    descriptions = [generate_text(rng.choice(marketplace_templates["description"][category]), marketplace_replacements, rng)[:200] for _ in range(batch_size)]
                     for j, (title, description) in enumerate(zip(titles, descriptions)):
-                        price = f"${random.randint(50, 1000)}"
+                        price = f"${rng.randint(50, 1000)}"
                         market = Marketplace(
                             category=category,
                             title=title,
                             description=description,
-                            user_id=random.choice(user_ids),
+                            user_id=rng.choice(user_ids),
                             price=price,
-                            date=random_timestamp()
+                            date=random_timestamp(rng, anchor)
                         )
                         db.session.add(market)
                         logger.info(f"Added {category} non-IAB post {i + j + 1}/{non_iab_posts}: {title[:30]}...")
@@ -385,17 +204,17 @@ def init_db():
                 # Buyers: all non-IAB
                 for i in range(0, NUM_POSTS_PER_CATEGORY, 5):  # Batch of 5
                     batch_size = min(5, NUM_POSTS_PER_CATEGORY - i)
-                    titles = [generate_text(random.choice(marketplace_templates["title"][category]), marketplace_replacements)[:100] for _ in range(batch_size)]
-                    descriptions = [generate_text(random.choice(marketplace_templates["description"][category]), marketplace_replacements)[:200] for _ in range(batch_size)]
+                    titles = [generate_text(rng.choice(marketplace_templates["title"][category]), marketplace_replacements, rng)[:100] for _ in range(batch_size)]
+                    descriptions = [generate_text(rng.choice(marketplace_templates["description"][category]), marketplace_replacements, rng)[:200] for _ in range(batch_size)]
                     for j, (title, description) in enumerate(zip(titles, descriptions)):
-                        price = f"Offer ${random.randint(50, 500)}"
+                        price = f"Offer ${rng.randint(50, 500)}"
                         market = Marketplace(
                             category=category,
                             title=title,
                             description=description,
-                            user_id=random.choice(user_ids),
+                            user_id=rng.choice(user_ids),
                             price=price,
-                            date=random_timestamp()
+                            date=random_timestamp(rng, anchor)
                         )
                         db.session.add(market)
                         logger.info(f"Added {category} marketplace post {i + j + 1}/{NUM_POSTS_PER_CATEGORY}: {title[:30]}...")
@@ -413,17 +232,17 @@ def init_db():
             logger.info(f"Populating {category} service posts with {NUM_POSTS_PER_CATEGORY} posts")
             for i in range(0, NUM_POSTS_PER_CATEGORY, 5):  # Batch of 5
                 batch_size = min(5, NUM_POSTS_PER_CATEGORY - i)
-                titles = [generate_text(random.choice(service_templates["title"][category]), service_replacements)[:100] for _ in range(batch_size)]
-                descriptions = [generate_text(random.choice(service_templates["description"][category]), service_replacements)[:200] for _ in range(batch_size)]
+                titles = [generate_text(rng.choice(service_templates["title"][category]), service_replacements, rng)[:100] for _ in range(batch_size)]
+                descriptions = [generate_text(rng.choice(service_templates["description"][category]), service_replacements, rng)[:200] for _ in range(batch_size)]
                 for j, (title, description) in enumerate(zip(titles, descriptions)):
-                    price = f"${random.randint(100, 2000)}" if category == 'Sell' else 'Negotiable'
+                    price = f"${rng.randint(100, 2000)}" if category == 'Sell' else 'Negotiable'
                     service = Service(
                         category=category,
                         title=title,
                         description=description,
-                        user_id=random.choice(user_ids),
+                        user_id=rng.choice(user_ids),
                         price=price,
-                        date=random_timestamp()
+                        date=random_timestamp(rng, anchor)
                     )
                     db.session.add(service)
                     logger.info(f"Added {category} service post {i + j + 1}/{NUM_POSTS_PER_CATEGORY}: {title[:30]}...")
@@ -437,20 +256,16 @@ def init_db():
 
         # Populate Comments (NUM_COMMENTS_PER_POST per post)
         logger.info(f"Populating comments ({NUM_COMMENTS_PER_POST} per post)")
-        announcement_ids = [(post.id, 'announcement') for post in Announcement.query.all()]
-        marketplace_ids = [(post.id, 'marketplace') for post in Marketplace.query.all()]
-        service_ids = [(post.id, 'service') for post in Service.query.all()]
-        all_posts = announcement_ids + marketplace_ids + service_ids
+        all_posts = db.session.query(Post.id, Post.post_type).order_by(Post.id).all()
         total_comments = len(all_posts) * NUM_COMMENTS_PER_POST
         for i, (post_id, post_type) in enumerate(all_posts):
             for j in range(NUM_COMMENTS_PER_POST):
-                content = generate_text(random.choice(comment_templates), comment_replacements)[:100]
+                content = generate_text(rng.choice(comment_templates), comment_replacements, rng)[:100]
                 comment = Comment(
-                    post_type=post_type,
                     post_id=post_id,
-                    user_id=random.choice(user_ids),
+                    user_id=rng.choice(user_ids),
                     content=content,
-                    date=random_timestamp()
+                    date=random_timestamp(rng, anchor)
                 )
                 db.session.add(comment)
                 logger.info(f"Added comment {j + 1}/{NUM_COMMENTS_PER_POST} for {post_type} post {post_id}: {content[:30]}...")
@@ -466,5 +281,228 @@ def init_db():
         logger.info("Database population completed successfully")
         print(f"Database initialized with 10 users, {total_posts} posts, {NUM_SHOUTBOX_MESSAGES} shoutbox messages, and {total_comments} comments.")
 
+# Bulk mode (python populate_db.py --bulk) settings
+BULK_BATCH_SIZE = 10000
+BULK_PASSWORD = 'password123'  # Shared by generated users so bcrypt runs once, not once per user
+BULK_PROGRESS_STEPS = 20  # Progress lines logged per table
+
+
+class Progress:
+    """Log row counts and throughput for one table every few percent instead of once per row."""
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.step = max(total // BULK_PROGRESS_STEPS, 1)
+        self.next_report = self.step
+        self.started = time.monotonic()
+
+    def advance(self, rows):
+        self.done += rows
+        if self.done >= self.next_report or self.done == self.total:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            percent = 100 * self.done // max(self.total, 1)
+            logger.info(f"{self.label}: {self.done}/{self.total} rows ({percent}%), {self.done / elapsed:,.0f} rows/s")
+            while self.next_report <= self.done:
+                self.next_report += self.step
+
+
+def tune_for_loading(connection):
+    """Trade durability for speed on this connection while the load runs (SQLite only).
+
+    A crash mid-load can corrupt the file, which is acceptable for a database that is being
+    rebuilt from scratch anyway.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.exec_driver_sql('PRAGMA journal_mode = MEMORY')
+    connection.exec_driver_sql('PRAGMA synchronous = OFF')
+    connection.exec_driver_sql('PRAGMA cache_size = -262144')  # 256 MiB
+    connection.exec_driver_sql('PRAGMA temp_store = MEMORY')
+
+
+def bulk_insert(connection, model, rows, total, batch_size, label=None):
+    """Insert rows from a generator with executemany in batches, reporting progress."""
+    progress = Progress(label or model.__tablename__, total)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(model.__table__.insert(), batch)
+            progress.advance(len(batch))
+            batch = []
+    if batch:
+        connection.execute(model.__table__.insert(), batch)
+        progress.advance(len(batch))
+
+
+def user_rows(count):
+    shared_hash = bcrypt.generate_password_hash(BULK_PASSWORD).decode('utf-8')
+    for username, password, avatar in USERS[:count]:
+        yield {'username': username, 'password': bcrypt.generate_password_hash(password).decode('utf-8'), 'avatar': avatar}
+    for n in range(len(USERS), count):
+        yield {'username': f'member{n:07d}', 'password': shared_hash, 'avatar': 'default.jpg'}
+
+
+# (model, row generator, categories, per-category count option, which is also the post_type)
+POST_TABLES = [
+    (Announcement, announcement_rows, ['Announcements', 'General', 'MM Service'], 'announcements'),
+    (Marketplace, marketplace_rows, ['Buyers', 'Sellers'], 'marketplace'),
+    (Service, service_rows, ['Buy', 'Sell'], 'services'),
+]
+
+
+def shard_counts(args, shards, shard):
+    """Per-table row counts for one shard of a bulk load."""
+    return {key: split_count(getattr(args, key), shards, shard)
+            for key in ('shoutbox', 'announcements', 'marketplace', 'services')}
+
+
+def load_posts(connection, rng, anchor, counts, user_ids, comments_per_post, batch_size, include_iab=True, label=''):
+    """Insert shoutbox messages, posts and their comments into freshly created tables."""
+    bulk_insert(connection, Shoutbox, shoutbox_rows(rng, anchor, counts['shoutbox'], user_ids),
+                counts['shoutbox'], batch_size, f'{label}shoutbox')
+    connection.commit()
+    for model, rows, categories, key in POST_TABLES:
+        extra = {'iab_posts': NUM_IAB_SELLER_POSTS} if include_iab and model is Marketplace else {}
+        for category in categories:
+            bulk_insert(connection, model, rows(rng, anchor, category, counts[key], user_ids, **extra),
+                        counts[key], batch_size, f'{label}{key} {category}')
+        connection.commit()
+        # The tables were just created and each post type is loaded in one go, so its posts have contiguous ids
+        first_id, last_id = connection.execute(db.select(db.func.min(model.id), db.func.max(model.id))).one()
+        if first_id is None:
+            continue
+        total = (last_id - first_id + 1) * comments_per_post
+        post_ids = range(first_id, last_id + 1)
+        bulk_insert(connection, Comment, comment_rows(rng, anchor, post_ids, comments_per_post, user_ids),
+                    total, batch_size, f'{label}comments on {key}')
+        connection.commit()
+
+
+def build_shard(job):
+    """Process pool worker: generate one shard into its own SQLite file and return its path."""
+    shard, path, seed, anchor, counts, user_ids, comments_per_post, batch_size = job
+    engine = create_engine(f'sqlite:///{path}')
+    # Table-level create skips the metadata hooks, so the shard gets no search index or triggers
+    for model in (Shoutbox, Post, Comment):
+        model.__table__.create(engine)
+    with engine.connect() as connection:
+        tune_for_loading(connection)
+        load_posts(connection, make_rng(seed, shard), anchor, counts, user_ids, comments_per_post, batch_size,
+                   include_iab=(shard == 0), label=f'[shard {shard}] ')
+    engine.dispose()
+    return path
+
+
+def merge_shard(connection, path):
+    """Append a shard's rows to the main database, shifting its post ids past the ones already there."""
+    connection.exec_driver_sql('ATTACH DATABASE ? AS shard', (path,))
+    offset = connection.execute(db.select(db.func.coalesce(db.func.max(Post.id), 0))).scalar()
+    columns = ', '.join(column.name for column in Post.__table__.columns if column.name != 'id')
+    connection.exec_driver_sql(
+        f'INSERT INTO main.post (id, {columns}) SELECT id + {offset}, {columns} FROM shard.post ORDER BY id'
+    )
+    columns = ', '.join(column.name for column in Shoutbox.__table__.columns if column.name != 'id')
+    connection.exec_driver_sql(f'INSERT INTO main.shoutbox ({columns}) SELECT {columns} FROM shard.shoutbox ORDER BY id')
+    connection.exec_driver_sql(
+        'INSERT INTO main.comment (post_id, user_id, content, date) '
+        f'SELECT post_id + {offset}, user_id, content, date FROM shard.comment ORDER BY id'
+    )
+    connection.commit()
+    connection.exec_driver_sql('DETACH DATABASE shard')
+
+
+def bulk_init_db(args):
+    """Rebuild the database with executemany inserts in large transactions.
+
+    Meant for load-testing datasets of millions of rows: the full-text index triggers are
+    suspended during the load and the search index, category counters and user summaries are
+    rebuilt in one pass at the end, when cached API responses are invalidated as well. With --shards N the posts are generated as N independently seeded shards
+    in a process pool and merged in shard order, so the result depends on the seed and the
+    shard count but not on the number of workers.
+    """
+    started = time.monotonic()
+    anchor = args.anchor or default_anchor(args.seed is not None)
+    logger.info(f"Starting bulk database initialization (seed={args.seed}, anchor={anchor}, shards={args.shards})")
+    with app.app_context():
+        with db.engine.begin() as connection:
+            migrations.drop_legacy_tables(connection)
+        db.drop_all()
+        migrations.upgrade()
+        # Commit-as-you-go: one transaction per table keeps fsyncs and lock churn to a minimum
+        with db.engine.connect() as connection:
+            tune_for_loading(connection)
+            search_index.drop_triggers(connection)
+            bulk_insert(connection, User, user_rows(args.users), args.users, args.batch_size)
+            connection.commit()
+            user_ids = connection.execute(db.select(User.id).order_by(User.id)).scalars().all()
+
+            if args.shards == 1:
+                load_posts(connection, make_rng(args.seed, 0), anchor, shard_counts(args, 1, 0), user_ids,
+                           args.comments_per_post, args.batch_size)
+            else:
+                with tempfile.TemporaryDirectory(prefix='populate_db_') as workdir:
+                    jobs = [(shard, os.path.join(workdir, f'shard_{shard}.db'), args.seed, anchor,
+                             shard_counts(args, args.shards, shard), user_ids, args.comments_per_post, args.batch_size)
+                            for shard in range(args.shards)]
+                    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                        # map() yields in shard order, so merging overlaps with generating later shards
+                        for shard, path in enumerate(pool.map(build_shard, jobs)):
+                            logger.info(f"Merging shard {shard + 1}/{args.shards}")
+                            merge_shard(connection, path)
+                            os.remove(path)
+
+            logger.info("Rebuilding search index, category counters and user summaries")
+            search_index.create(connection)
+            search_index.rebuild(connection)
+            counters.rebuild(connection)
+            user_summary.rebuild(connection)
+            response_cache.bump_all(connection)
+            connection.commit()
+            if database.is_sqlite(connection):
+                # Back to the normal journal and sync settings before the connection is pooled again
+                database.apply_pragmas(connection.connection.dbapi_connection)
+    logger.info(f"Bulk database initialization completed in {time.monotonic() - started:.1f}s")
+
+
+def parse_anchor(value):
+    return datetime.fromisoformat(value).replace(microsecond=0)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Populate the forum database with simulated data.")
+    parser.add_argument('--seed', help="Seed for reproducible data; the same seed and anchor give the same rows")
+    parser.add_argument('--anchor', type=parse_anchor,
+                        help="Time generated dates count back from, e.g. 2025-01-01T12:00 "
+                             "(default: now, or 2025-01-01T00:00 with --seed)")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Fast loader for large datasets; the options below apply to this mode")
+    parser.add_argument('--users', type=int, default=len(USERS), help="Total users; the 10 named accounts come first")
+    parser.add_argument('--shoutbox', type=int, default=NUM_SHOUTBOX_MESSAGES, help="Shoutbox messages")
+    parser.add_argument('--announcements', type=int, default=NUM_POSTS_PER_CATEGORY, help="Posts per announcement category")
+    parser.add_argument('--marketplace', type=int, default=NUM_POSTS_PER_CATEGORY, help="Posts per marketplace category")
+    parser.add_argument('--services', type=int, default=NUM_POSTS_PER_CATEGORY, help="Posts per service category")
+    parser.add_argument('--comments-per-post', type=int, default=NUM_COMMENTS_PER_POST, help="Comments on every post")
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE, help="Rows per executemany call")
+    parser.add_argument('--shards', type=int, default=1, help="Generate posts as this many independently seeded shards")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes generating shards in parallel")
+    parser.add_argument('--if-empty', action='store_true', help="Leave an existing database with users in it untouched")
+    args = parser.parse_args()
+    if args.shards > 1 and not database.DATABASE_URI.startswith('sqlite'):
+        parser.error("--shards merges SQLite files and needs the SQLite backend")
+    return args
+
+def has_users():
+    with app.app_context():
+        return inspect(db.engine).has_table(User.__tablename__) and db.session.query(User.id).first() is not None
+
 if __name__ == '__main__':
-    init_db()
\ No newline at end of file
+    args = parse_args()
+    if args.if_empty and has_users():
+        logger.info("Database already populated, leaving it as is")
+    elif args.bulk:
+        bulk_init_db(args)
+    else:
+        init_db(args.seed, args.anchor)
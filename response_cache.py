@@ -0,0 +1,183 @@
+# response_cache.py
+import logging
+import pickle
+import threading
+from collections import OrderedDict
+from flask import Response, request
+from sqlalchemy import event
+import database
+from models import db, Shoutbox, Post, Announcement, Marketplace, Service, Comment, CacheGeneration
+
+logger = logging.getLogger(__name__)
+
+# Tables whose writes invalidate cached responses. Every insert, update or delete through the
+# ORM bumps the table's generation in the same transaction, whichever process makes it (the
+# app, populate_db.py or the simulators, which all import this module). Posts keep one
+# generation per post type, so a new service does not invalidate the marketplace listings.
+CACHED_MODELS = [Shoutbox, Post, Comment]
+POST_MODELS = [Announcement, Marketplace, Service]
+
+
+def generation_name(model, post_type=None):
+    """Name of the generation counter for a model: its table, plus the post type for posts."""
+    if issubclass(model, Post):
+        return f'{Post.__tablename__}:{post_type or model.__mapper__.polymorphic_identity}'
+    return model.__tablename__
+
+
+def _bump(connection, table_name):
+    table = CacheGeneration.__table__
+    database.upsert(connection, table, {'table_name': table_name, 'generation': 1},
+                    {'generation': table.c.generation + 1})
+
+
+def _register(model):
+    def bump(mapper, connection, target):
+        _bump(connection, generation_name(model, getattr(target, 'post_type', None)))
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, name, bump, propagate=True)
+
+
+for _model in CACHED_MODELS:
+    _register(_model)
+
+
+def bump_all(connection):
+    """Invalidate every cached response, e.g. after a bulk load that bypassed the ORM."""
+    for model in [Shoutbox, Comment] + POST_MODELS:
+        _bump(connection, generation_name(model))
+
+
+class MemoryBackend:
+    """Per-process LRU store; also the local stand-in for a shared backend."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'size': len(self._entries), 'evictions': self.evictions}
+
+
+class RedisBackend:
+    """Store shared by every worker. Needs the redis package, which is not a default dependency."""
+
+    def __init__(self, url, ttl=3600, prefix='forum:response:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        # Redis evicts by ttl and its own maxmemory policy rather than by entry count
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+    def stats(self):
+        info = self._client.info('stats')
+        return {'backend': 'redis', 'evictions': info.get('evicted_keys', 0)}
+
+
+def backend_from_url(url, maxsize=256):
+    """Pick a backend from a storage URL, in the same style as the rate limiter's storage_uri."""
+    if url.startswith('memory://'):
+        return MemoryBackend(maxsize)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported response cache URL: {url}")
+
+
+class ResponseCache:
+    """Caches the body of GET responses keyed by endpoint and parameters.
+
+    Each entry remembers the generations of the tables it was built from. A lookup reads the
+    current generations (one query on a tiny table) and rebuilds the entry when any of them has
+    moved on, so a write anywhere shows up on the next request without scanning the post tables.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def key():
+        """Build the cache key for the current request from its endpoint and parameters."""
+        view_args = ','.join(f'{name}={value}' for name, value in sorted((request.view_args or {}).items()))
+        query = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+        return f'{request.endpoint}:{view_args}?{query}'
+
+    @staticmethod
+    def generations(table_names):
+        rows = dict(db.session.query(CacheGeneration.table_name, CacheGeneration.generation).filter(
+            CacheGeneration.table_name.in_(table_names)
+        ).all())
+        return tuple(rows.get(table_name, 0) for table_name in table_names)
+
+    def get_or_build(self, models, build):
+        """Return a cached copy of build()'s response, rebuilding it if models changed since."""
+        key = self.key()
+        generations = self.generations([generation_name(model) for model in models])
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read failed: {str(e)}")
+            entry = None
+        if entry is not None and entry[0] == generations:
+            with self._lock:
+                self.hits += 1
+            _, status, mimetype, body = entry
+            return Response(body, status=status, mimetype=mimetype)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.stale += 1
+        response = build()
+        if response.status_code == 200:
+            try:
+                self.backend.set(key, (generations, response.status_code, response.mimetype, response.get_data()))
+            except Exception as e:
+                logger.error(f"Response cache write failed: {str(e)}")
+        return response
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Hits, misses, entries rebuilt after a write (stale) and the backend's own counters."""
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses, 'stale': self.stale}
+        stats.update(self.backend.stats())
+        return stats
@@ -0,0 +1,159 @@
+# search_index.py
+import re
+from sqlalchemy import event, text
+from models import db, Post
+
+# Full-text search over announcements, marketplace posts and services.
+#
+# SQLite: an FTS5 table holding the searchable text of every post under the post's id, with
+# the post type as a third, zero-weight column so a typed search is a column filter in the same
+# MATCH rather than a lookup per hit. Triggers on the post table keep it in sync.
+# PostgreSQL: a GIN expression index on the post table, which the database maintains itself.
+# Anything else falls back to a LIKE scan.
+FTS_TABLE = 'post_search'
+TS_CONFIG = 'simple'
+SOURCE_TABLE = Post.__tablename__
+
+# Indexed expression; must match the query exactly for PostgreSQL to use the GIN index
+TS_DOCUMENT = f"to_tsvector('{TS_CONFIG}', coalesce(title, '') || ' ' || coalesce(body, ''))"
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported(bind):
+    """Return True if the bound database can host the FTS5 index."""
+    return bind.dialect.name == 'sqlite'
+
+
+def is_postgres(bind):
+    return bind.dialect.name == 'postgresql'
+
+
+TRIGGER_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {SOURCE_TABLE}_search_ai AFTER INSERT ON {SOURCE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body, post_type) VALUES (new.id, new.title, new.body, new.post_type);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SOURCE_TABLE}_search_ad AFTER DELETE ON {SOURCE_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SOURCE_TABLE}_search_au AFTER UPDATE ON {SOURCE_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, title, body, post_type) VALUES (new.id, new.title, new.body, new.post_type);
+    END""",
+]
+
+
+def create(connection):
+    """Create the FTS table and sync triggers, filling the index if the table is new."""
+    if is_postgres(connection):
+        connection.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{SOURCE_TABLE}_search ON {SOURCE_TABLE} USING gin ({TS_DOCUMENT})'
+        ))
+    if not is_supported(connection):
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first()
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, body, post_type, "
+        f"tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    for ddl in TRIGGER_DDL:
+        connection.execute(text(ddl))
+    if not exists:
+        rebuild(connection)
+
+
+def drop(connection):
+    """Drop the FTS table; the triggers go away with the post table."""
+    if not is_supported(connection):
+        return
+    connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+
+
+def drop_triggers(connection):
+    """Suspend index maintenance, e.g. for a bulk load that calls create() and rebuild() afterwards."""
+    if is_postgres(connection):
+        connection.execute(text(f'DROP INDEX IF EXISTS ix_{SOURCE_TABLE}_search'))
+    if not is_supported(connection):
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {SOURCE_TABLE}_search_{suffix}'))
+
+
+def rebuild(connection):
+    """Re-index every post from scratch and return the number of indexed rows."""
+    if is_postgres(connection):
+        connection.execute(text(f'REINDEX INDEX ix_{SOURCE_TABLE}_search'))
+        return connection.execute(text(f'SELECT count(*) FROM {SOURCE_TABLE}')).scalar()
+    if not is_supported(connection):
+        return 0
+    connection.execute(text(f'DELETE FROM {FTS_TABLE}'))
+    connection.execute(text(
+        f'INSERT INTO {FTS_TABLE}(rowid, title, body, post_type) SELECT id, title, body, post_type FROM {SOURCE_TABLE}'
+    ))
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    return connection.execute(text(f'SELECT count(*) FROM {FTS_TABLE}')).scalar()
+
+
+def _match_expression(query):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _search_postgres(query, post_type, limit, offset):
+    """Ranked search on the GIN index; title hits weigh twice as much as body hits."""
+    tokens = TOKEN_RE.findall(query)
+    params = {'limit': limit, 'offset': offset, 'match': ' & '.join(f'{token}:*' for token in tokens), 'type': post_type}
+    type_filter = 'post_type = :type' if post_type else ''
+    if tokens:
+        weighted = (f"setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') || "
+                    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(body, '')), 'B')")
+        tsquery = f"to_tsquery('{TS_CONFIG}', :match)"
+        where = f'WHERE {TS_DOCUMENT} @@ {tsquery}' + (f' AND {type_filter}' if type_filter else '')
+        sql = (f"SELECT id FROM {SOURCE_TABLE} {where} "
+               f"ORDER BY ts_rank('{{0, 0, 0.5, 1}}', {weighted}, {tsquery}) DESC, date DESC, id DESC")
+    else:
+        # No search terms: list everything, newest rows first
+        where = f'WHERE {type_filter}' if type_filter else ''
+        sql = f'SELECT id FROM {SOURCE_TABLE} {where} ORDER BY date DESC, id DESC'
+    return db.session.execute(text(sql + ' LIMIT :limit OFFSET :offset'), params).scalars().all()
+
+
+def _search_like(query, post_type, limit, offset):
+    """Fallback for other databases: substring match, newest posts first."""
+    posts = db.session.query(Post.id).filter(Post.title.ilike(f'%{query}%') | Post.body.ilike(f'%{query}%'))
+    if post_type:
+        posts = posts.filter(Post.post_type == post_type)
+    return [post_id for (post_id,) in posts.order_by(Post.date.desc(), Post.id.desc()).limit(limit).offset(offset)]
+
+
+def search(query, post_type='', limit=50, offset=0):
+    """Return the ids of the posts matching query, best match first."""
+    if is_postgres(db.engine):
+        return _search_postgres(query, post_type, limit, offset)
+    if not is_supported(db.engine):
+        return _search_like(query, post_type, limit, offset)
+    terms = _match_expression(query)
+    if terms:
+        # Search terms only match the text, never the post type column
+        terms = f'{{title body}} : ({terms})'
+    match = terms
+    if post_type:
+        type_filter = 'post_type : "{}"'.format(post_type.replace('"', '""'))
+        match = f'{terms} AND {type_filter}' if terms else type_filter
+    params = {'match': match, 'limit': limit, 'offset': offset}
+    if terms:
+        # Title hits weigh twice as much as body hits; the post type does not count
+        sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY bm25({FTS_TABLE}, 2.0, 1.0, 0.0) LIMIT :limit OFFSET :offset'
+    else:
+        # No search terms: list everything, newest rows first
+        where = f'WHERE {FTS_TABLE} MATCH :match' if match else ''
+        sql = f'SELECT rowid FROM {FTS_TABLE} {where} ORDER BY rowid DESC LIMIT :limit OFFSET :offset'
+    return db.session.execute(text(sql), params).scalars().all()
+
+
+event.listen(db.metadata, 'after_create', lambda target, connection, **kw: create(connection))
+event.listen(db.metadata, 'before_drop', lambda target, connection, **kw: drop(connection))
@@ -1,28 +1,11 @@
 # sellers_simulator.py
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from models import db, User, Marketplace
-from datetime import datetime
-import random
+from models import Marketplace
+from simulator import Simulator, register, main
+import itertools
 import logging
-import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('sellers_simulator.log')
-    ]
-)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
 # Post templates
 positive_list = [
     "Company: Monarch Real Estate Investments\nLocation: USA, NY\nRevenue: $380M\nAccess: Citrix > internal RDP > DA\nPersistence set, untouched for 4+ days\nBacked up docs + client lease agreements accessible\nPrice: 0.7 BTC, serious people only",
@@ -87,18 +70,18 @@ neutral_replacements = {
     "price": ["0.02 BTC", "0.05 BTC", "0.01 BTC", "0.03 BTC", "$50"]
 }
 
-def paraphrase_post(template, replacements):
+def paraphrase_post(template, replacements, rng):
     """Paraphrase a post by replacing placeholders or modifying structure."""
     try:
         text = template
         for key, values in replacements.items():
-            text = text.replace(f"{{{key}}}", random.choice(values))
+            text = text.replace(f"{{{key}}}", rng.choice(values))
         # Randomly tweak structure for variety
         lines = text.split('\n')
-        if random.random() < 0.3:  # 30% chance to shuffle lines
-            random.shuffle(lines)
-        if random.random() < 0.2:  # 20% chance to add prefix
-            lines.insert(0, random.choice(["FOR SALE: ", "NEW DROP: ", "OFFER: "]))
+        if rng.random() < 0.3:  # 30% chance to shuffle lines
+            rng.shuffle(lines)
+        if rng.random() < 0.2:  # 20% chance to add prefix
+            lines.insert(0, rng.choice(["FOR SALE: ", "NEW DROP: ", "OFFER: "]))
         text = '\n'.join(lines)
         # Extract title (first line or first 100 chars)
         title = text.split('\n')[0][:100]
@@ -110,61 +93,40 @@ def paraphrase_post(template, replacements):
         logger.error(f"Error paraphrasing post: {str(e)}")
         return "Error Post", "Generated post error", "DM for price"
 
-def add_sellers_post(post_type):
-    """Add a single post to the Sellers marketplace."""
-    with app.app_context():
-        user_ids = [user.id for user in User.query.all()]
-        if not user_ids:
-            logger.error("No users found in database")
-            return False
+# Every 10 posts: 4 neutral, 4 negative, 2 positive
+POST_MIX = ["neutral"] * 4 + ["negative"] * 4 + ["positive"] * 2
+TEMPLATES = {
+    "positive": (positive_list, positive_replacements),
+    "negative": (negative_list, negative_replacements),
+    "neutral": (neutral_list, neutral_replacements),
+}
 
-        # Select template based on post type
-        if post_type == "positive":
-            template = random.choice(positive_list)
-            replacements = positive_replacements
-        elif post_type == "negative":
-            template = random.choice(negative_list)
-            replacements = negative_replacements
-        else:  # neutral
-            template = random.choice(neutral_list)
-            replacements = neutral_replacements
+@register
+class SellersSimulator(Simulator):
+    """Listings in the Sellers marketplace category, 10 a minute by default."""
+    name = 'sellers'
+    rate = 10 / 60
 
-        title, description, price = paraphrase_post(template, replacements)
-        post = Marketplace(
-            category="Sellers",
-            title=title[:100],
-            description=description[:200],
-            user_id=random.choice(user_ids),
-            price=price[:20],
-            date=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        )
-        try:
-            db.session.add(post)
-            db.session.commit()
-            logger.info(f"Added {post_type} Sellers post: {title[:30]}... by user {post.user_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Error committing {post_type} Sellers post: {str(e)}")
-            db.session.rollback()
-            return False
+    def __init__(self, rng, rate=None):
+        super().__init__(rng, rate)
+        self._mix = itertools.cycle(POST_MIX)
 
-def main():
-    logger.info("Starting Sellers simulator")
-    try:
-        while True:
-            # Add 10 posts: 4 neutral, 4 negative, 2 positive
-            for _ in range(4):
-                add_sellers_post("neutral")
-            for _ in range(4):
-                add_sellers_post("negative")
-            for _ in range(2):
-                add_sellers_post("positive")
-            logger.info("Added batch of 10 Sellers posts, waiting 60 seconds")
-            time.sleep(60)
-    except KeyboardInterrupt:
-        logger.info("Sellers simulator stopped by user")
-    except Exception as e:
-        logger.error(f"Simulator crashed: {str(e)}")
+    def generate(self, count, user_ids, now):
+        posts = []
+        for _ in range(count):
+            post_type = next(self._mix)
+            templates, replacements = TEMPLATES[post_type]
+            title, description, price = paraphrase_post(self.rng.choice(templates), replacements, self.rng)
+            posts.append(Marketplace(
+                category="Sellers",
+                title=title[:100],
+                description=description[:200],
+                user_id=self.rng.choice(user_ids),
+                price=price[:20],
+                date=now
+            ))
+            logger.debug(f"Generated {post_type} Sellers post: {title[:30]}...")
+        return posts
 
 if __name__ == '__main__':
-    main()
+    main(simulators=['sellers'], log_file='sellers_simulator.log')
@@ -0,0 +1,152 @@
+# shoutbox_hub.py
+import json
+import logging
+import queue
+import threading
+import database
+from models import db, Shoutbox
+from per_process import PerProcess
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_shout(item, username, dumps=json.dumps):
+    """Render one shoutbox row as the JSON payload used by /api/shoutbox and the stream."""
+    return dumps({
+        'id': item.id,
+        'username': username,
+        'message': item.message,
+        'timestamp': item.timestamp
+    })
+
+
+class ShoutboxHub:
+    """Fans new shoutbox messages out to every Server-Sent Events subscriber in this process.
+
+    A single background thread polls for rows with an id above the last one it has seen, so
+    the database cost is one indexed range read per interval no matter how many clients are
+    connected, and nothing at all while nobody is listening. Messages posted through the app
+    wake the poller instead of waiting for the next interval; they are still delivered by the
+    poll, so rows committed in between by other processes go out with them in id order. The
+    poller only moves up to database.settled_ids, so a shout committed late on PostgreSQL with a
+    lower id than one already sent is not stepped over. While nobody is listening the poller
+    forgets its position and the next subscriber starts from the newest shout.
+
+    A subscriber whose queue fills up is sent None and dropped, so its stream ends and the
+    browser reconnects with Last-Event-ID instead of silently missing shouts.
+    """
+
+    def __init__(self, app, users, interval=1.0, queue_size=100, max_subscribers=None):
+        self.app = app
+        self.users = users
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self.dropped = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_id = None
+        self._poller = PerProcess(self._start_poller)
+
+    def subscribe(self):
+        """Register a new client and return the queue its events are delivered to, or None
+        when max_subscribers clients are already subscribed in this process."""
+        self._poller.get()
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            self._subscribers.add(subscriber)
+        self._wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        """Counters for this process: open streams, streams turned away at the cap and streams
+        ended because the client fell behind."""
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'rejected': self.rejected, 'dropped': self.dropped}
+
+    def notify(self):
+        """Poll now, e.g. right after this process committed a shoutbox row."""
+        self._wakeup.set()
+
+    def _publish(self, items):
+        """Deliver already-committed shoutbox rows to every subscriber, oldest first."""
+        items = sorted(items, key=lambda item: item.id)
+        with self._lock:
+            fresh = [item for item in items if item.id > self._last_id]
+            if not fresh:
+                return
+            self._last_id = fresh[-1].id
+            subscribers = list(self._subscribers)
+        names = self.users.usernames(item.user_id for item in fresh)
+        events = [(item.id, serialize_shout(item, names.get(item.user_id), self.app.json.dumps)) for item in fresh]
+        for subscriber in subscribers:
+            try:
+                for event in events:
+                    subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client must not hold up the others
+                logger.warning("Ending the shoutbox stream of a slow subscriber")
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        """Unsubscribe a client and replace its queued events with None, which ends its stream."""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            self.dropped += 1
+        # Only the poller puts into the queue, so once it is emptied the marker always fits
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
+
+    def _start_poller(self):
+        # Each gunicorn worker polls for its own subscribers
+        thread = threading.Thread(target=self._run, name='shoutbox-hub', daemon=True)
+        thread.start()
+        return thread
+
+    def _settled_id(self):
+        table = Shoutbox.__table__
+        return database.settled_ids(db.session.connection(), [table])[table]
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    listening = bool(self._subscribers)
+                if not listening:
+                    # Shouts posted while nobody listens are not streamed to the next subscriber
+                    self._last_id = None
+                    self._wakeup.wait()
+                    self._wakeup.clear()
+                    continue
+                try:
+                    settled_id = self._settled_id()
+                    if self._last_id is None:
+                        self._last_id = settled_id
+                    else:
+                        rows = Shoutbox.query.filter(
+                            Shoutbox.id > self._last_id, Shoutbox.id <= settled_id
+                        ).order_by(Shoutbox.id).all()
+                        if rows:
+                            self._publish(rows)
+                except database.WritesInFlight as e:
+                    # Poll again next interval rather than step over a shout still being committed
+                    logger.info(f"Shoutbox hub poll deferred: {str(e)}")
+                except Exception as e:
+                    logger.error(f"Shoutbox hub poll failed: {str(e)}")
+                finally:
+                    db.session.remove()
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
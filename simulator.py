@@ -0,0 +1,240 @@
+# simulator.py
+from flask import Flask
+import database
+from models import db, User, Post, Service, Comment
+from datagen import make_rng, generate_text, comment_templates, comment_replacements, service_rows
+import counters  # keeps the category counters in step with inserted posts
+import user_summary  # keeps the per-user post and comment counts in step
+import response_cache  # invalidates cached API responses for inserted rows
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import asyncio
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+database.init_app(app, db)
+
+# Modules whose simulators are registered when the runner starts
+PLUGIN_MODULES = ['sellers_simulator', 'shoutbox_simulator']
+
+# Simulators run when none are named on the command line
+DEFAULT_SIMULATORS = ['sellers', 'shoutbox']
+
+# name -> Simulator subclass, filled by @register
+SIMULATORS = {}
+
+
+def register(cls):
+    """Class decorator that makes a Simulator available to the runner under cls.name."""
+    SIMULATORS[cls.name] = cls
+    return cls
+
+
+class Simulator:
+    """One kind of simulated activity. Subclasses set name and rate and implement generate().
+
+    rate is the default number of rows per second; the runner calls generate() once per tick
+    with however many rows are due and commits everything generated in that tick together.
+    """
+    name = None
+    rate = 0.0
+
+    def __init__(self, rng, rate=None):
+        self.rng = rng
+        self.rate = self.rate if rate is None else rate
+        self._credit = 0.0
+
+    def due(self, elapsed, scale):
+        """Return how many rows to generate for elapsed seconds, carrying the fraction over."""
+        self._credit += self.rate * scale * elapsed
+        count = int(self._credit)
+        self._credit -= count
+        return count
+
+    def generate(self, count, user_ids, now):
+        """Return count new model instances. Called inside an app context."""
+        raise NotImplementedError
+
+
+@register
+class CommentSimulator(Simulator):
+    """Comments on recent announcements, marketplace posts and services."""
+    name = 'comments'
+    rate = 1 / 30
+    RECENT_POSTS = 50
+
+    def generate(self, count, user_ids, now):
+        post_ids = db.session.query(Post.id).order_by(Post.date.desc()).limit(self.RECENT_POSTS).all()
+        if not post_ids:
+            return []
+        comments = []
+        for _ in range(count):
+            comments.append(Comment(
+                post_id=self.rng.choice(post_ids)[0],
+                user_id=self.rng.choice(user_ids),
+                content=generate_text(self.rng.choice(comment_templates), comment_replacements, self.rng)[:100],
+                date=now
+            ))
+        return comments
+
+
+@register
+class ServiceSimulator(Simulator):
+    """New Buy and Sell service offers."""
+    name = 'services'
+    rate = 1 / 120
+
+    def generate(self, count, user_ids, now):
+        services = []
+        for _ in range(count):
+            for row in service_rows(self.rng, now, self.rng.choice(['Buy', 'Sell']), 1, user_ids):
+                row['date'] = now
+                services.append(Service(**row))
+        return services
+
+
+class SimulatorRunner:
+    """Drives a set of simulators from one asyncio loop.
+
+    Every tick each simulator generates the rows it is due at its rate (times scale), and all
+    of them are added and committed in one transaction. User ids are loaded once and refreshed
+    every users_refresh seconds; category counters are reconciled every reconcile_interval
+    seconds. Database work runs on a single worker thread so it never blocks the loop's timing.
+    """
+
+    def __init__(self, app, simulators, tick=1.0, scale=1.0, users_refresh=60, reconcile_interval=600):
+        self.app = app
+        self.simulators = simulators
+        self.tick = tick
+        self.scale = scale
+        self.users_refresh = users_refresh
+        self.reconcile_interval = reconcile_interval
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='simulator-db')
+        self._user_ids = []
+        self._users_loaded = None
+        self.written = {simulator.name: 0 for simulator in simulators}
+
+    def _load_user_ids(self):
+        with self.app.app_context():
+            self._user_ids = [user_id for (user_id,) in db.session.query(User.id).all()]
+        self._users_loaded = time.monotonic()
+
+    def _write_tick(self, elapsed):
+        """Generate and commit one tick's rows; returns {simulator name: rows written}."""
+        if self._users_loaded is None or time.monotonic() - self._users_loaded >= self.users_refresh:
+            self._load_user_ids()
+        if not self._user_ids:
+            logger.error("No users found in database")
+            return {}
+        now = datetime.now().replace(microsecond=0)
+        written = {}
+        with self.app.app_context():
+            rows = []
+            for simulator in self.simulators:
+                count = simulator.due(elapsed, self.scale)
+                if count:
+                    generated = simulator.generate(count, self._user_ids, now)
+                    rows.extend(generated)
+                    written[simulator.name] = len(generated)
+            if not rows:
+                return {}
+            try:
+                db.session.add_all(rows)
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error committing {len(rows)} simulated rows: {str(e)}")
+                db.session.rollback()
+                return {}
+        for name, count in written.items():
+            self.written[name] += count
+        return written
+
+    def _reconcile(self):
+        with self.app.app_context():
+            return counters.reconcile()
+
+    async def _ticks(self, deadline):
+        loop = asyncio.get_running_loop()
+        last = time.monotonic()
+        while deadline is None or last < deadline:
+            await asyncio.sleep(max(0.0, last + self.tick - time.monotonic()))
+            now = time.monotonic()
+            written = await loop.run_in_executor(self._executor, self._write_tick, now - last)
+            last = now
+            if written:
+                logger.info("Added " + ", ".join(f"{count} {name}" for name, count in sorted(written.items())))
+
+    async def _reconciler(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            drift = await loop.run_in_executor(self._executor, self._reconcile)
+            logger.info(f"Reconciled category counts, {len(drift)} counter(s) drifted")
+
+    async def run(self, duration=None):
+        """Run until cancelled, or for duration seconds."""
+        deadline = time.monotonic() + duration if duration else None
+        reconciler = asyncio.ensure_future(self._reconciler())
+        try:
+            await self._ticks(deadline)
+        finally:
+            reconciler.cancel()
+            self._executor.shutdown(wait=True)
+
+
+def parse_rate(value):
+    name, _, rate = value.partition('=')
+    try:
+        return name, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected NAME=ROWS_PER_SECOND, got '{value}'")
+
+
+def main(argv=None, simulators=None, log_file='simulator.log'):
+    """Run the simulators named on the command line (or the given defaults) until interrupted."""
+    for module in PLUGIN_MODULES:
+        importlib.import_module(module)
+    parser = argparse.ArgumentParser(description="Simulate forum activity from a single event loop.")
+    simulators = simulators or DEFAULT_SIMULATORS
+    parser.add_argument('simulators', nargs='*', default=simulators,
+                        help=f"Simulators to run, from {', '.join(sorted(SIMULATORS))} (default: {' '.join(simulators)})")
+    parser.add_argument('--rate', action='append', type=parse_rate, default=[], metavar='NAME=ROWS_PER_SECOND',
+                        help="Override a simulator's rate; may be repeated")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every rate, e.g. 100 for soak tests")
+    parser.add_argument('--tick', type=float, default=1.0, help="Seconds between batched commits")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--seed', help="Seed for a reproducible sequence of rows")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler(log_file)
+        ]
+    )
+    unknown = set(args.simulators) - set(SIMULATORS) | {name for name, _ in args.rate} - set(SIMULATORS)
+    if unknown:
+        parser.error(f"Unknown simulator(s): {', '.join(sorted(unknown))}")
+    rates = dict(args.rate)
+    instances = [SIMULATORS[name](make_rng(args.seed, name), rates.get(name)) for name in args.simulators]
+    runner = SimulatorRunner(app, instances, tick=args.tick, scale=args.scale)
+    logger.info("Starting simulators: " + ", ".join(
+        f"{simulator.name} at {simulator.rate * args.scale:g}/s" for simulator in instances))
+    try:
+        asyncio.run(runner.run(args.duration))
+    except KeyboardInterrupt:
+        logger.info("Simulators stopped by user")
+    logger.info("Wrote " + ", ".join(f"{count} {name}" for name, count in sorted(runner.written.items())))
+
+
+if __name__ == '__main__':
+    # Go through the importable module so plug-ins and the runner share one registry
+    from simulator import main
+    main()
@@ -1,20 +1,61 @@
 // static/js/main.js
 $(document).ready(function() {
+    // Shoutbox messages are user input, so they are inserted as text and never parsed as HTML
+    function shoutElement(item) {
+        return $('<p>').append(
+            $('<strong>').text(item.username),
+            document.createTextNode(` (${item.timestamp}): ${item.message}`)
+        );
+    }
+
     // Function to load shoutbox
+    // ifModified makes jQuery send the last ETag, so unchanged data comes back as an empty 304
     function loadShoutbox() {
-        $.get('/api/shoutbox', function(data) {
+        $.ajax({url: '/api/shoutbox', ifModified: true}).done(function(data, status) {
+            if (status === 'notmodified') {
+                return;
+            }
             $('#shoutbox').empty();
             data.forEach(function(item) {
-                $('#shoutbox').append(
-                    `<p><strong>${item.username}</strong> (${item.timestamp}): ${item.message}</p>`
-                );
+                $('#shoutbox').append(shoutElement(item));
             });
         });
     }
 
+    // Receive new shoutbox messages as they are posted; fall back to polling if streaming is unavailable
+    let shoutboxPoller = null;
+    let shoutboxStream = null;
+    function startShoutboxPolling() {
+        if (!shoutboxPoller) {
+            shoutboxPoller = setInterval(loadShoutbox, 5000);
+        }
+    }
+    function streamShoutbox() {
+        if (!window.EventSource) {
+            startShoutboxPolling();
+            return;
+        }
+        shoutboxStream = new EventSource('/api/shoutbox/stream');
+        shoutboxStream.addEventListener('shout', function(e) {
+            const item = JSON.parse(e.data);
+            $('#shoutbox').prepend(shoutElement(item));
+            $('#shoutbox p').slice(10).remove();
+        });
+        shoutboxStream.onerror = function() {
+            // The browser reconnects on its own; poll only once it gives up
+            if (shoutboxStream.readyState === EventSource.CLOSED) {
+                shoutboxStream = null;
+                startShoutboxPolling();
+            }
+        };
+    }
+
     // Function to load category counts
     function loadCategoryCounts() {
-        $.get('/api/category_counts', function(data) {
+        $.ajax({url: '/api/category_counts', ifModified: true}).done(function(data, status) {
+            if (status === 'notmodified') {
+                return;
+            }
             $('#announcements-count').text(data.announcements.Announcements || 0);
             $('#general-count').text(data.announcements.General || 0);
             $('#mm-service-count').text(data.announcements['MM Service'] || 0);
@@ -136,8 +177,8 @@ $(document).ready(function() {
     if ($('#shoutbox').length) {
         loadShoutbox();
         loadCategoryCounts();
-        // Poll shoutbox every 5 seconds
-        setInterval(loadShoutbox, 5000);
+        // Stream new shoutbox messages (polls every 5 seconds as a fallback)
+        streamShoutbox();
     }
 
     // Load data on marketplace or services page
@@ -160,10 +201,21 @@ $(document).ready(function() {
         e.preventDefault();
         let message = $('#shoutbox-message').val();
         if (message) {
-            $('#shoutbox').prepend(
-                `<p><strong>${currentUser || 'Guest'}</strong> (${new Date().toISOString()}): ${message}</p>`
-            );
-            $('#shoutbox-message').val('');
+            // Sent as JSON: other sites cannot send that content type without a CORS preflight
+            $.ajax({
+                url: '/api/shoutbox',
+                method: 'POST',
+                contentType: 'application/json',
+                data: JSON.stringify({message: message})
+            }).done(function() {
+                $('#shoutbox-message').val('');
+                // Streaming clients receive their own message through the stream
+                if (!shoutboxStream) {
+                    loadShoutbox();
+                }
+            }).fail(function() {
+                console.error('Failed to post shoutbox message');
+            });
         }
     });
 
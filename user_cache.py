@@ -0,0 +1,93 @@
+# user_cache.py
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import db, User
+
+
+class CachedUser(UserMixin):
+    """The public part of a user row: what Flask-Login and the serializers need, no password."""
+
+    def __init__(self, id, username, avatar):
+        self.id = id
+        self.username = username
+        self.avatar = avatar
+
+
+class UserCache:
+    """In-process LRU cache of user id -> CachedUser with a time-to-live.
+
+    Backs the Flask-Login user loader and the author names in every listing, so a warm worker
+    answers those without touching the user table. Users changed or deleted through the ORM in
+    this process are dropped when the transaction commits; changes made by other processes are
+    picked up once the entry's ttl runs out.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        event.listen(User, 'after_update', self._mark_changed)
+        event.listen(User, 'after_delete', self._mark_changed)
+        event.listen(Session, 'after_commit', self._invalidate_changed)
+
+    def get(self, user_id):
+        """Return the CachedUser for user_id, or None if there is no such user."""
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        """Return {user_id: CachedUser} for the given ids, loading all misses in one query."""
+        found = {}
+        missing = set()
+        now = time.monotonic()
+        with self._lock:
+            for user_id in set(user_ids):
+                entry = self._entries.get(user_id)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[0]
+                else:
+                    missing.add(user_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            rows = db.session.query(User.id, User.username, User.avatar).filter(User.id.in_(missing)).all()
+            loaded = {row.id: CachedUser(row.id, row.username, row.avatar) for row in rows}
+            with self._lock:
+                for user_id, user in loaded.items():
+                    self._entries[user_id] = (user, now + self.ttl)
+                    self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            found.update(loaded)
+        return found
+
+    def usernames(self, user_ids):
+        """Return {user_id: username} for the given ids."""
+        return {user_id: user.username for user_id, user in self.get_many(user_ids).items()}
+
+    def invalidate(self, user_id=None):
+        """Forget one user, or everyone when user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _mark_changed(self, mapper, connection, target):
+        # Evicting only after commit keeps a concurrent request from re-caching the old row
+        object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+    def _invalidate_changed(self, session):
+        for user_id in session.info.pop('changed_user_ids', ()):
+            self.invalidate(user_id)
@@ -0,0 +1,64 @@
+# user_summary.py
+import logging
+from sqlalchemy import case, event, func, literal, or_, select, union_all
+import database
+from models import db, Post, Comment, UserSummary
+
+logger = logging.getLogger(__name__)
+
+
+def _bump(connection, user_id, posts, comments, date):
+    """Adjust one user's summary inside the transaction that inserted or deleted the row."""
+    table = UserSummary.__table__
+    values = {
+        'post_count': table.c.post_count + posts,
+        'comment_count': table.c.comment_count + comments,
+    }
+    if date is not None:
+        date = literal(date, table.c.last_active.type)
+        values['last_active'] = case(
+            (or_(table.c.last_active.is_(None), table.c.last_active < date), date),
+            else_=table.c.last_active
+        )
+    database.upsert(connection, table, {
+        'user_id': user_id, 'post_count': max(posts, 0), 'comment_count': max(comments, 0), 'last_active': date
+    }, values)
+
+
+def _register(model, posts, comments):
+    # propagate so the listeners also fire for the Post subclasses
+    @event.listens_for(model, 'after_insert', propagate=True)
+    def after_insert(mapper, connection, target):
+        _bump(connection, target.user_id, posts, comments, target.date)
+
+    @event.listens_for(model, 'after_delete', propagate=True)
+    def after_delete(mapper, connection, target):
+        # last_active is left alone: the user was still active then
+        _bump(connection, target.user_id, -posts, -comments, None)
+
+
+_register(Post, 1, 0)
+_register(Comment, 0, 1)
+
+
+def summary(user_id):
+    """Return {'post_count', 'comment_count', 'last_active'} for a user with one primary key read."""
+    row = db.session.get(UserSummary, user_id)
+    if row is None:
+        return {'post_count': 0, 'comment_count': 0, 'last_active': None}
+    return {'post_count': row.post_count, 'comment_count': row.comment_count, 'last_active': row.last_active}
+
+
+def rebuild(connection):
+    """Replace every summary with exact values computed from the post and comment tables."""
+    table = UserSummary.__table__
+    activity = union_all(
+        select(Post.user_id, literal(1).label('posts'), literal(0).label('comments'), Post.date),
+        select(Comment.user_id, literal(0), literal(1), Comment.date)
+    ).subquery()
+    connection.execute(table.delete())
+    connection.execute(table.insert().from_select(
+        ['user_id', 'post_count', 'comment_count', 'last_active'],
+        select(activity.c.user_id, func.sum(activity.c.posts), func.sum(activity.c.comments), func.max(activity.c.date))
+        .group_by(activity.c.user_id)
+    ))